@@ -0,0 +1,41 @@
+import hashlib
+from django.utils import timezone
+from apps.shop.cart import cart_summary
+from .models import Article
+
+
+def touch_article(article_id):
+    """
+    Отмечает изменение ветки статьи (комментарии, лайки) для условных GET.
+    Метка хранится в самой статье, поэтому её видят все процессы.
+    """
+    Article.objects.filter(pk=article_id).update(activity_at=timezone.now())
+
+
+def _article_state(request, slug):
+    # etag и last_modified вызываются для одного запроса, статью читаем один раз
+    if not hasattr(request, '_article_state'):
+        article = Article.objects.filter(slug=slug).values('id', 'updated_at', 'activity_at').first()
+        if article is not None:
+            article['activity'] = max(article['updated_at'], article['activity_at'] or article['updated_at'])
+        request._article_state = article
+    return request._article_state
+
+
+def article_etag(request, slug):
+    state = _article_state(request, slug)
+    if state is None:
+        return None
+    user = request.user
+    # Счётчик корзины в шапке тоже часть страницы
+    cart_count = cart_summary(user)['count'] if user.is_authenticated else 0
+    raw = f"{state['id']}:{state['activity'].isoformat()}:{user.pk}:{user.is_staff}:{cart_count}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def article_last_modified(request, slug):
+    # Страница авторизованного пользователя зависит от него самого, ей хватает ETag
+    state = _article_state(request, slug)
+    if state is None or request.user.is_authenticated:
+        return None
+    return state['activity']
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:19
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def fill_excerpts(apps, schema_editor):
+    Article = apps.get_model('articles', 'Article')
+    articles = list(Article.objects.only('id', 'content'))
+    for article in articles:
+        article.excerpt = Truncator(article.content).chars(120)
+    Article.objects.bulk_update(articles, ['excerpt'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0005_comment_article_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=120),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-created_at', '-id'], name='article_created_idx'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
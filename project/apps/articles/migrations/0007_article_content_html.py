@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:20
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+
+
+def render_contents(apps, schema_editor):
+    Article = apps.get_model('articles', 'Article')
+    articles = list(Article.objects.only('id', 'content'))
+    for article in articles:
+        article.content_html = linebreaks(article.content, autoescape=True)
+    Article.objects.bulk_update(articles, ['content_html'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0006_article_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_contents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:35
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_all_active(apps, schema_editor):
+    # Прежние метки жили в кэше и теряются: считаем, что все ветки изменились сейчас
+    Article = apps.get_model('articles', 'Article')
+    Article.objects.update(activity_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0007_article_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='activity_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(mark_all_active, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,54 @@
 from django.db import models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
 from apps.users.models import User
 from apps.shop.models import Like
 
 
+EXCERPT_LENGTH = 120
+
+
+def make_excerpt(content):
+    return Truncator(content).chars(EXCERPT_LENGTH)
+
+
 class Article(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
+    # Начало текста для списка статей и готовый HTML статьи, обновляются в save()
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False)
+    content_html = models.TextField(blank=True, editable=False)
+    # Последнее изменение комментариев и лайков, для условных GET (см. caching.py)
+    activity_at = models.DateTimeField(null=True, blank=True, editable=False)
     slug = models.SlugField(unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='article_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if 'content' not in self.get_deferred_fields():
+            self.excerpt = make_excerpt(self.content)
+            self.content_html = linebreaks(self.content, autoescape=True)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'excerpt', 'content_html'}
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
     article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='comments')
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['article', '-created_at', '-id'], name='comment_article_created_idx'),
+        ]
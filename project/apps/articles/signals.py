@@ -0,0 +1,26 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.shop.models import LikeCounter
+from .caching import touch_article
+from .models import Article, Comment
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, origin=None, **kwargs):
+    # Комментарии удаляются вместе со статьёй — отмечать нечего
+    if isinstance(origin, Article):
+        return
+    touch_article(instance.article_id)
+
+
+@receiver(post_save, sender=LikeCounter)
+def likes_changed(sender, instance, **kwargs):
+    # Счётчики лайков статьи и её комментариев выводятся на странице статьи
+    content_type = ContentType.objects.get_for_id(instance.content_type_id)
+    if content_type.model_class() is Article:
+        touch_article(instance.object_id)
+    elif content_type.model_class() is Comment:
+        article_id = Comment.objects.filter(pk=instance.object_id).values_list('article_id', flat=True).first()
+        if article_id is not None:
+            touch_article(article_id)
@@ -0,0 +1,203 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from apps.shop.likes import toggle_vote
+from apps.shop.models import Category, Product
+from apps.users.models import User
+from .models import EXCERPT_LENGTH, Article, Comment
+from .views import COMMENTS_PER_PAGE
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='editor', password='secret', is_staff=True)
+        cls.article = Article.objects.create(title='Протеин', content='Текст', slug='protein')
+        authors = User.objects.bulk_create([User(username=f'reader{i}') for i in range(5)])
+        Comment.objects.bulk_create([
+            Comment(user=authors[i % 5], article=cls.article, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        ])
+
+    def test_thread_is_paginated(self):
+        response = self.client.get(reverse('articles:article', args=[self.article.slug]))
+        self.assertEqual(len(response.context['comments']), COMMENTS_PER_PAGE)
+        self.assertEqual(response.context['comments_count'], COMMENTS_PER_PAGE + 5)
+
+        cursor = response.context['comments'].next_cursor
+        data = self.client.get(reverse('articles:comments', args=[self.article.slug]), {'cursor': cursor}).json()
+        self.assertEqual(data['html'].count('class="comment '), 5)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_ajax_create_and_delete_return_fragment(self):
+        self.client.force_login(self.staff)
+        data = self.client.post(
+            reverse('articles:comment_create', args=[self.article.slug]), {'text': 'Новый'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        ).json()
+        self.assertEqual(data['count'], COMMENTS_PER_PAGE + 6)
+        self.assertEqual(data['html'].count('class="comment '), 1)
+        self.assertIn('Новый', data['html'])
+
+        comment = Comment.objects.get(text='Новый')
+        data = self.client.post(
+            reverse('articles:comment_delete', args=[comment.pk]), HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        ).json()
+        self.assertEqual(data, {'success': True, 'deleted': comment.pk, 'count': COMMENTS_PER_PAGE + 5})
+
+
+class ArticleViewQueryTests(TestCase):
+    """Каждый view статей делает фиксированное число запросов независимо от объёма ветки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='editor', password='secret', is_staff=True)
+        cls.articles = Article.objects.bulk_create([
+            Article(title=f'Статья {i}', content='Текст', slug=f'article-{i}') for i in range(5)
+        ])
+        cls.article = cls.articles[0]
+        authors = User.objects.bulk_create([User(username=f'reader{i}') for i in range(10)])
+        Comment.objects.bulk_create([
+            Comment(user=author, article=cls.article, text='Комментарий') for author in authors
+        ])
+
+    def setUp(self):
+        cache.clear()
+        # ContentType кэшируется на весь процесс, в тестах прогреваем явно
+        ContentType.objects.get_for_models(Article, Comment)
+
+    def ajax_post(self, url, data=None):
+        return self.client.post(url, data or {}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_list(self):
+        # число статей, страница с комментариями и лайками, самые залайканные
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('articles:articles'))
+        article = next(a for a in response.context['articles'] if a.pk == self.article.pk)
+        self.assertEqual((article.comments_count, article.likes), (10, 0))
+        self.assertIn('content', article.get_deferred_fields())
+
+    def test_detail_anonymous(self):
+        # версия статьи для ETag, статья с числом комментариев,
+        # комментарии с авторами, лайки статьи и комментариев
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('articles:article', args=[self.article.slug]))
+        self.assertEqual(response.context['comments_count'], 10)
+
+    def test_detail_authenticated(self):
+        self.client.force_login(self.staff)
+        # + сессия, пользователь и сводка корзины в шапке
+        with self.assertNumQueries(8):
+            self.client.get(reverse('articles:article', args=[self.article.slug]))
+
+    def test_comments_page(self):
+        with self.assertNumQueries(3):
+            self.client.get(reverse('articles:comments', args=[self.article.slug]))
+
+    def test_create(self):
+        self.client.force_login(self.staff)
+        # сессия, пользователь, сводка корзины в шапке
+        with self.assertNumQueries(3):
+            self.client.get(reverse('articles:create'))
+        # сессия, пользователь, проверка уникальности слага, вставка
+        with self.assertNumQueries(4):
+            self.client.post(reverse('articles:create'), {'title': 'Новая', 'content': 'Текст', 'slug': 'new'})
+
+    def test_update(self):
+        self.client.force_login(self.staff)
+        url = reverse('articles:edit', args=[self.article.slug])
+        # сессия, пользователь, статья, сводка корзины в шапке
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        # сессия, пользователь, статья, проверка уникальности слага, обновление
+        with self.assertNumQueries(5):
+            self.client.post(url, {'title': 'Статья', 'content': 'Новый текст', 'slug': self.article.slug})
+
+    def test_delete(self):
+        self.client.force_login(self.staff)
+        # сессия, пользователь, статья, комментарии (для сигналов post_delete),
+        # удаление комментариев и самой статьи
+        with self.assertNumQueries(6):
+            response = self.ajax_post(reverse('articles:delete', args=[self.article.slug]))
+        self.assertEqual(response.json(), {'success': True})
+
+    def test_comment_create(self):
+        self.client.force_login(self.staff)
+        # сессия, пользователь, статья, вставка, метка активности статьи, число комментариев
+        with self.assertNumQueries(6):
+            self.ajax_post(reverse('articles:comment_create', args=[self.article.slug]), {'text': 'Новый'})
+
+    def test_comment_delete(self):
+        self.client.force_login(self.staff)
+        comment = Comment.objects.filter(article=self.article).first()
+        # сессия, пользователь, комментарий со статьёй, удаление, метка активности статьи,
+        # число комментариев
+        with self.assertNumQueries(6):
+            self.ajax_post(reverse('articles:comment_delete', args=[comment.pk]))
+
+
+class ArticleExcerptTests(TestCase):
+    def test_excerpt_follows_content(self):
+        article = Article.objects.create(title='Креатин', content='Слово ' * 100, slug='creatine')
+        self.assertEqual(len(article.excerpt), EXCERPT_LENGTH)
+        self.assertTrue(article.excerpt.endswith('…'))
+
+        article.content = 'Коротко'
+        article.save(update_fields=['content'])
+        self.assertEqual(Article.objects.get().excerpt, 'Коротко')
+
+
+class ArticleConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.article = Article.objects.create(title='Протеин', content='Первый абзац\n\nВторой <b>абзац</b>', slug='protein')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('articles:article', args=[self.article.slug])
+
+    def test_rendered_body_is_stored(self):
+        self.assertEqual(self.article.content_html, '<p>Первый абзац</p>\n\n<p>Второй &lt;b&gt;абзац&lt;/b&gt;</p>')
+
+    def test_repeat_read_gets_304_until_thread_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        comment = Comment.objects.create(user=self.user, article=self.article, text='Новый')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        toggle_vote(self.user, comment, True)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_cart(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.url)['ETag']
+        product = Product.objects.create(
+            name='Whey', description='Протеин', price=50,
+            category=Category.objects.create(name='Протеины', slug='proteins'),
+        )
+        self.client.post(reverse('shop:to_cart', args=[product.pk]))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_activity_is_stored_in_database(self):
+        etag = self.client.get(self.url)['ETag']
+        Comment.objects.create(user=self.user, article=self.article, text='Новый')
+        # Метка не зависит от локального кэша процесса
+        cache.clear()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified_for_anonymous(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
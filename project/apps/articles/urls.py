@@ -9,6 +9,7 @@ urlpatterns = [
     path('<slug:slug>/', views.ArticleDetailView.as_view(), name='article'),
     path('<slug:slug>/edit/', views.ArticleUpdateView.as_view(), name='edit'),
     path('<slug:slug>/delete/', views.ArticleDeleteView.as_view(), name='delete'),
+    path('<slug:slug>/comments/', views.CommentListView.as_view(), name='comments'),
     path('<slug:slug>/comment/', views.CommentCreateView.as_view(), name='comment_create'),
     path('comment/<int:pk>/delete/', views.CommentDeleteView.as_view(), name='comment_delete'),
 ]
\ No newline at end of file
@@ -3,21 +3,62 @@ from django.views import View
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from apps.shop.likes import attach_likes, top_liked
+from apps.shop.models import LikeCounter
+from apps.shop.pagination import keyset_paginate
 from .models import Article, Comment
 from .forms import ArticleForm
-from django.http import HttpResponse
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from .caching import article_etag, article_last_modified
+
+
+ARTICLES_PER_PAGE = 12
+
+COMMENTS_PER_PAGE = 20
+
+COMMENT_ORDERING = ('-created_at', '-id')
+
+
+def comment_page(article, cursor=None):
+    """Страница комментариев статьи (новые сверху) вместе с авторами."""
+    comments = Comment.objects.filter(article=article).select_related('user')
+    return keyset_paginate(comments, COMMENT_ORDERING, cursor, COMMENTS_PER_PAGE)
+
+
+def is_ajax(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
 
 
 class ArticleListView(ListView):
     model = Article
     template_name = 'articles/articles.html'
     context_object_name = 'articles'
-    ordering = ['-created_at']
+    paginate_by = ARTICLES_PER_PAGE
+
+    def get_queryset(self):
+        """Карточки без полного текста: выдержка, число комментариев и лайков одним запросом."""
+        counters = LikeCounter.objects.filter(
+            content_type=ContentType.objects.get_for_model(Article), object_id=OuterRef('pk'),
+        )
+        return (
+            Article.objects.defer('content', 'content_html')
+            .annotate(
+                comments_count=Count('comments'),
+                likes=Coalesce(Subquery(counters.values('likes')[:1]), Value(0)),
+            )
+            .order_by('-created_at', '-id')
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['popular_articles'] = top_liked(Article.objects.only('title', 'slug'))
         if self.request.user.is_staff:
             context['form'] = ArticleForm()
         return context
@@ -41,15 +82,22 @@ class ArticleCreateView(UserPassesTestMixin, View):
         return render(request, self.template_name, {"form": form})
 
 
+@method_decorator(condition(etag_func=article_etag, last_modified_func=article_last_modified), name='dispatch')
 class ArticleDetailView(DetailView):
     model = Article
     template_name = 'articles/article.html'
     context_object_name = 'article'
 
+    def get_queryset(self):
+        # число комментариев приходит вместе со статьёй, а не отдельным COUNT
+        return Article.objects.defer('content', 'excerpt').annotate(comments_count=Count('comments'))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        article = self.get_object()
-        context['comments'] = article.comments.all()
+        comments = comment_page(self.object)
+        attach_likes([self.object, *comments], self.request.user)
+        context['comments'] = comments
+        context['comments_count'] = self.object.comments_count
         return context
 
 
@@ -73,22 +121,36 @@ class ArticleDeleteView(UserPassesTestMixin, DeleteView):
     def test_func(self):
         return self.request.user.is_staff
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # страница статей после AJAX-удаления загружается самим браузером
+        if is_ajax(self.request):
+            return JsonResponse({'success': True})
+        return response
+
+
+class CommentListView(View):
+    """Следующая страница комментариев: {'html', 'next_cursor'}."""
+
+    def get(self, request, slug):
+        article = get_object_or_404(Article.objects.only('id'), slug=slug)
+        comments = attach_likes(comment_page(article, request.GET.get('cursor')), request.user)
+        html = render_to_string('articles/comments.html', {'comments': comments}, request=request)
+        return JsonResponse({'html': html, 'next_cursor': comments.next_cursor})
+
 
 class CommentCreateView(LoginRequiredMixin, View):
     def post(self, request, slug):
-        article = get_object_or_404(Article, slug=slug)
-        text = request.POST.get('text')
-        if text:
-            Comment.objects.create(user=request.user, article=article, text=text)
-
-        # AJAX
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            html = render_to_string(
-                'articles/comments.html',
-                {'comments': article.comments.all()},
-                request=request
-            )
-            return HttpResponse(html)
+        article = get_object_or_404(Article.objects.only('id', 'slug'), slug=slug)
+        text = request.POST.get('text', '').strip()
+        comment = Comment.objects.create(user=request.user, article=article, text=text) if text else None
+
+        # AJAX: отдаём только новый комментарий и счётчик, а не всю ветку
+        if is_ajax(request):
+            if comment is None:
+                return JsonResponse({'success': False}, status=400)
+            html = render_to_string('articles/comment.html', {'comment': comment}, request=request)
+            return JsonResponse({'success': True, 'html': html, 'count': article.comments.count()})
 
         return redirect(reverse('articles:article', args=[slug]))
 
@@ -98,17 +160,13 @@ class CommentDeleteView(UserPassesTestMixin, View):
         return self.request.user.is_staff
 
     def post(self, request, pk):
-        comment = get_object_or_404(Comment, pk=pk)
-        article_slug = comment.article.slug
+        comment = get_object_or_404(
+            Comment.objects.select_related('article').only('id', 'article__id', 'article__slug'), pk=pk,
+        )
+        article = comment.article
         comment.delete()
 
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            article = get_object_or_404(Article, slug=article_slug)
-            html = render_to_string(
-                'articles/comments.html',
-                {'comments': article.comments.all()},
-                request=request
-            )
-            return HttpResponse(html)
+        if is_ajax(request):
+            return JsonResponse({'success': True, 'deleted': pk, 'count': article.comments.count()})
 
-        return redirect(reverse('articles:article', args=[article_slug]))
+        return redirect(reverse('articles:article', args=[article.slug]))
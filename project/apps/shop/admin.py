@@ -1,5 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import Category, Product, CartItem, Order, OrderItem
+from .orders import bulk_change_status, log_status
 
 
 @admin.register(Category)
@@ -10,10 +11,10 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'created_at')
+    list_display = ('name', 'category', 'price', 'stock', 'rating_avg', 'rating_count', 'created_at')
     list_filter = ('category',)
     search_fields = ('name',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('stock', 'rating_avg', 'rating_count', 'created_at', 'updated_at')
 
 
 admin.site.register(CartItem)
@@ -24,3 +25,38 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'total_price', 'created_at')
     list_filter = ('status', 'created_at')
     readonly_fields = ('created_at',)
+    actions = ['mark_shipped', 'mark_delivered', 'mark_canceled']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Статус существующего заказа меняется только действиями и change_order_status:
+        # там же возвращаются и списываются остатки и пишется журнал
+        if obj is not None:
+            return (*self.readonly_fields, 'status')
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        # Форма сохраняется в транзакции админки, событие пишется в ней же
+        super().save_model(request, obj, form, change)
+        if not change:
+            log_status([obj.pk], obj.status)
+
+    def _change_status(self, request, queryset, status):
+        outcomes = bulk_change_status(queryset.values_list('id', flat=True), status)
+        updated = sum(outcome['result'] == 'updated' for outcome in outcomes.values())
+        self.message_user(request, f"Статус изменён у {updated} заказов.", messages.SUCCESS)
+        if updated < len(outcomes):
+            self.message_user(
+                request, f"Пропущено {len(outcomes) - updated}: переход из их статуса запрещён.", messages.WARNING,
+            )
+
+    @admin.action(description="Отметить как отправленные")
+    def mark_shipped(self, request, queryset):
+        self._change_status(request, queryset, 'shipped')
+
+    @admin.action(description="Отметить как доставленные")
+    def mark_delivered(self, request, queryset):
+        self._change_status(request, queryset, 'delivered')
+
+    @admin.action(description="Отменить")
+    def mark_canceled(self, request, queryset):
+        self._change_status(request, queryset, 'canceled')
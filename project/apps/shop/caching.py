@@ -0,0 +1,63 @@
+import hashlib
+from functools import wraps
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+CATALOG = 'catalog'
+CATEGORIES = 'categories'
+
+
+def product_namespace(product_id):
+    return f'product:{product_id}'
+
+
+def _version_key(namespace):
+    return f'shop:version:{namespace}'
+
+
+def get_versions(*namespaces):
+    """Текущие версии пространств ключей (одним обращением к кэшу)."""
+    keys = [_version_key(ns) for ns in namespaces]
+    found = cache.get_many(keys)
+    return [found.get(key, 1) for key in keys]
+
+
+def bump_version(namespace):
+    """Инвалидирует все ключи пространства, не удаляя их по одному."""
+    key = _version_key(namespace)
+    if not cache.add(key, 2, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+
+
+def cache_anonymous_page(namespaces):
+    """
+    Кэширует отрендеренную страницу для анонимных GET-запросов.
+
+    namespaces(request, *args, **kwargs) возвращает список пространств,
+    от которых зависит страница; их версии входят в ключ, поэтому
+    после изменения данных старые записи просто перестают читаться.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            spaces = namespaces(request, *args, **kwargs)
+            versions = get_versions(*spaces)
+            path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            tag = '.'.join(f'{ns}={v}' for ns, v in zip(spaces, versions))
+            key = f'shop:page:{view.__name__}:{tag}:{path_hash}'
+            content = cache.get(key)
+            if content is not None:
+                return HttpResponse(content)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response.content, PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
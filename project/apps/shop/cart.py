@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+from .models import CartItem, Product
+
+CART_CACHE_TIMEOUT = 60 * 60
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _cart_key(user_id):
+    return f'shop:cart:{user_id}'
+
+
+def line_total():
+    return ExpressionWrapper(F('quantity') * F('product__price'), output_field=MONEY)
+
+
+def _money_sum(condition=None):
+    return Coalesce(Sum(line_total(), filter=condition, output_field=MONEY), 0, output_field=MONEY)
+
+
+def _load_cart_summary(user_id, item_id=None):
+    aggregates = {
+        'count': Count('id'),
+        'total': _money_sum(),
+    }
+    if item_id is not None:
+        item = Q(id=item_id)
+        aggregates['item_quantity'] = Sum('quantity', filter=item)
+        aggregates['item_total'] = _money_sum(item)
+    summary = CartItem.objects.filter(user_id=user_id).aggregate(**aggregates)
+    cache.set(_cart_key(user_id), {'count': summary['count'], 'total': summary['total']}, CART_CACHE_TIMEOUT)
+    return summary
+
+
+def cart_summary(user):
+    """Количество позиций и сумма корзины; в БД идёт только при промахе кэша."""
+    summary = cache.get(_cart_key(user.pk))
+    if summary is None:
+        summary = _load_cart_summary(user.pk)
+    return summary
+
+
+def refresh_cart_summary(user, item_id=None):
+    """
+    Пересчитывает сводку после изменения корзины одним агрегирующим запросом
+    и кладёт её в кэш. Если передан item_id, в тот же запрос добавляются
+    item_quantity и item_total этой позиции (None, если позиции больше нет).
+    """
+    return _load_cart_summary(user.pk, item_id)
+
+
+def _upsert_cart_item(user, product_id, on_conflict):
+    cart_table = connection.ops.quote_name(CartItem._meta.db_table)
+    product_table = connection.ops.quote_name(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {cart_table} (user_id, product_id, quantity)
+            SELECT %s, id, 1 FROM {product_table} WHERE id = %s
+            ON CONFLICT (user_id, product_id) DO {on_conflict}
+            """,
+            [user.pk, product_id],
+        )
+        return cursor.rowcount
+
+
+def add_to_cart(user, product_id):
+    """
+    Добавляет товар в корзину или увеличивает количество на 1 одним
+    INSERT ... ON CONFLICT DO UPDATE, без гонок при двойном клике.
+    Возвращает False, если такого товара нет.
+    """
+    return _upsert_cart_item(
+        user, product_id, f"UPDATE SET quantity = {connection.ops.quote_name(CartItem._meta.db_table)}.quantity + 1"
+    ) > 0
+
+
+def toggle_cart_item(user, product_id):
+    """
+    Убирает товар из корзины, а если его там не было — добавляет.
+    Возвращает 'removed', 'added' или None, если такого товара нет.
+    """
+    deleted, _ = CartItem.objects.filter(user=user, product_id=product_id).delete()
+    if deleted:
+        return 'removed'
+    if _upsert_cart_item(user, product_id, 'NOTHING'):
+        return 'added'
+    # Строку мог только что вставить параллельный запрос: товар уже в корзине
+    if Product.objects.filter(pk=product_id).exists():
+        return 'added'
+    return None
+
+
+def invalidate_cart_summaries(user_ids):
+    cache.delete_many([_cart_key(user_id) for user_id in user_ids])
@@ -1,10 +1,16 @@
-from .models import CartItem
+from functools import cache
+from .cart import cart_summary
 
 
 def cart_count(request):
-    """Добавляет количество товаров в корзине во все шаблоны."""
-    if request.user.is_authenticated:
-        count = CartItem.objects.filter(user=request.user).count()
-    else:
-        count = 0
+    """Добавляет количество товаров в корзине во все шаблоны.
+
+    Значение вычисляется лениво — только если шаблон его выводит —
+    и берётся из кэша сводки корзины.
+    """
+    @cache
+    def count():
+        if not request.user.is_authenticated:
+            return 0
+        return cart_summary(request.user)['count']
     return {'cart_count': count}
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from django.db.models import Count, Q
+
+PRICE_BUCKETS = [(None, 50), (50, 100), (100, 150), (150, None)]
+
+# Шаг цены: верхняя граница интервала [low, high) в ссылке — price_max = high - шаг,
+# потому что price_max в фильтре каталога включительный
+PRICE_STEP = Decimal('0.01')
+RATING_THRESHOLDS = [4, 3, 2, 1]
+
+
+def _count(condition):
+    return Count('id', filter=condition) if condition else Count('id')
+
+
+def _conditions_except(conditions, *names):
+    result = Q()
+    for name, condition in conditions.items():
+        if name not in names:
+            result &= condition
+    return result
+
+
+def price_bucket_condition(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def product_facets(queryset, conditions, categories):
+    """
+    Считает фасеты каталога одним запросом через условную агрегацию.
+
+    queryset — товары до применения фасетных фильтров, conditions — словарь
+    Q-условий по фасетам ('category', 'price', 'rating'). Счётчики каждого
+    фасета учитывают все фильтры, кроме собственного, чтобы было видно,
+    сколько товаров останется при выборе другого значения.
+    """
+    aggregates = {'total': _count(_conditions_except(conditions))}
+    others = _conditions_except(conditions, 'category')
+    # «Все категории» — те же фильтры без категории, как у счётчиков категорий
+    aggregates['all_categories'] = _count(others)
+    for cat in categories:
+        aggregates[f'category_{cat.pk}'] = _count(others & Q(category_id=cat.pk))
+    others = _conditions_except(conditions, 'price')
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{i}'] = _count(others & price_bucket_condition(low, high))
+    others = _conditions_except(conditions, 'rating')
+    for threshold in RATING_THRESHOLDS:
+        aggregates[f'rating_{threshold}'] = _count(others & Q(rating_avg__gte=threshold))
+
+    counts = queryset.order_by().aggregate(**aggregates)
+    return {
+        'total': counts['total'],
+        'all_categories': counts['all_categories'],
+        'categories': {cat.pk: counts[f'category_{cat.pk}'] for cat in categories},
+        'price': [
+            {'min': low, 'max': high, 'count': counts[f'price_{i}']}
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'rating': [
+            {'min': threshold, 'count': counts[f'rating_{threshold}']}
+            for threshold in RATING_THRESHOLDS
+        ],
+    }
@@ -3,6 +3,15 @@ from .models import Product
 
 
 class ProductForm(forms.ModelForm):
+    # Остаток не редактируется напрямую: поступление прибавляется к нему в БД.
+    # Пустое поле у нового товара — остаток не учитывается
+    restock = forms.IntegerField(
+        min_value=0,
+        required=False,
+        label='Поступление, шт.',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '0'}),
+    )
+
     class Meta:
         model = Product
         fields = ['name', 'description', 'price', 'category', 'image']
@@ -0,0 +1,126 @@
+from collections import defaultdict
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from .models import Like, LikeCounter
+
+LIKEABLE_MODELS = {
+    'article': 'articles.Article',
+    'comment': 'articles.Comment',
+    'review': 'shop.Review',
+}
+
+
+def likeable_model(kind):
+    """Модель по короткому имени из LIKEABLE_MODELS или None."""
+    label = LIKEABLE_MODELS.get(kind)
+    return apps.get_model(label) if label else None
+
+
+def _count_vote(counter, is_like, delta):
+    if is_like:
+        counter.likes += delta
+    else:
+        counter.dislikes += delta
+
+
+@transaction.atomic
+def toggle_vote(user, obj, is_like):
+    """
+    Ставит голос пользователя за объект, меняет его знак или снимает
+    повторный голос того же знака. Строка счётчика блокируется на время
+    изменения, поэтому одновременные клики не расходятся с таблицей Like.
+    Возвращает {'likes', 'dislikes', 'user_vote'}.
+    """
+    content_type = ContentType.objects.get_for_model(obj)
+    counter, _ = LikeCounter.objects.select_for_update().get_or_create(
+        content_type=content_type, object_id=obj.pk,
+    )
+    vote = Like.objects.filter(user=user, content_type=content_type, object_id=obj.pk).first()
+    if vote is None:
+        Like.objects.create(user=user, content_type=content_type, object_id=obj.pk, is_like=is_like)
+        _count_vote(counter, is_like, 1)
+        user_vote = is_like
+    elif vote.is_like == is_like:
+        vote.delete()
+        _count_vote(counter, is_like, -1)
+        user_vote = None
+    else:
+        Like.objects.filter(pk=vote.pk).update(is_like=is_like)
+        _count_vote(counter, vote.is_like, -1)
+        _count_vote(counter, is_like, 1)
+        user_vote = is_like
+    counter.save(update_fields=['likes', 'dislikes'])
+    return {'likes': counter.likes, 'dislikes': counter.dislikes, 'user_vote': user_vote}
+
+
+def attach_likes(objects, user=None):
+    """
+    Проставляет объектам likes, dislikes и user_vote (True, False или None).
+    Один запрос на каждый тип объектов в списке: счётчики читаются из
+    LikeCounter, голос пользователя подтягивается подзапросом.
+    """
+    groups = defaultdict(list)
+    for obj in objects:
+        groups[obj._meta.concrete_model].append(obj)
+
+    for model, group in groups.items():
+        content_type = ContentType.objects.get_for_model(model)
+        counters = LikeCounter.objects.filter(content_type=content_type, object_id__in=[obj.pk for obj in group])
+        if user is not None and user.is_authenticated:
+            counters = counters.annotate(user_vote=Subquery(
+                Like.objects.filter(
+                    user=user, content_type=content_type, object_id=OuterRef('object_id'),
+                ).values('is_like')[:1]
+            ))
+        found = {counter.object_id: counter for counter in counters}
+        for obj in group:
+            counter = found.get(obj.pk)
+            obj.likes = counter.likes if counter else 0
+            obj.dislikes = counter.dislikes if counter else 0
+            obj.user_vote = getattr(counter, 'user_vote', None)
+    return objects
+
+
+def like_stats(obj):
+    return {
+        'likes': getattr(obj, 'likes', 0),
+        'dislikes': getattr(obj, 'dislikes', 0),
+        'user_vote': getattr(obj, 'user_vote', None),
+    }
+
+
+def top_liked(queryset, limit=5):
+    """
+    Самые залайканные объекты queryset. Порядок берётся только из
+    LikeCounter по индексу likecounter_top_idx, сами объекты — одним in_bulk.
+    """
+    content_type = ContentType.objects.get_for_model(queryset.model)
+    ids = list(
+        LikeCounter.objects.filter(content_type=content_type, likes__gt=0)
+        .order_by('-likes', 'object_id')
+        .values_list('object_id', flat=True)[:limit]
+    )
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+@transaction.atomic
+def rebuild_like_counters():
+    """Пересчитывает LikeCounter с нуля по таблице Like. Возвращает число строк."""
+    rows = Like.objects.values('content_type', 'object_id').order_by().annotate(
+        likes=Count('id', filter=Q(is_like=True)),
+        dislikes=Count('id', filter=Q(is_like=False)),
+    )
+    LikeCounter.objects.all().delete()
+    counters = LikeCounter.objects.bulk_create([
+        LikeCounter(
+            content_type_id=row['content_type'],
+            object_id=row['object_id'],
+            likes=row['likes'],
+            dislikes=row['dislikes'],
+        )
+        for row in rows
+    ], batch_size=1000)
+    return len(counters)
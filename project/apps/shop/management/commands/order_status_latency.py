@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.shop.models import Order
+from apps.shop.reports import status_latency
+
+
+class Command(BaseCommand):
+    help = "Показывает медиану и 95-й перцентиль времени, которое заказы проводят в каждом статусе"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="За сколько последних дней учитывать переходы")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        latency = status_latency(since)
+        if not latency:
+            self.stdout.write("Нет завершённых переходов за выбранный период.")
+            return
+        for status, label in Order.STATUS_CHOICES:
+            if status in latency:
+                row = latency[status]
+                self.stdout.write(f"{label:<10} n={row['count']:<6} p50={row['p50']}  p95={row['p95']}")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.shop.likes import rebuild_like_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает с нуля счётчики лайков и дизлайков (LikeCounter) по таблице Like"
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_like_counters()
+        self.stdout.write(self.style.SUCCESS(f"✅ Счётчики лайков пересчитаны для {rebuilt} объектов."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает средний рейтинг, количество отзывов и распределение оценок у всех товаров"
+
+    def handle(self, *args, **options):
+        updated = Product.objects.refresh_ratings()
+        self.stdout.write(self.style.SUCCESS(f"✅ Рейтинги пересчитаны для {updated} товаров."))
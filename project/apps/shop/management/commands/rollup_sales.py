@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.shop.rollups import update_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Обновляет дневные сводки продаж по заказам, изменившимся с прошлого запуска"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Перестроить сводки за всё время с нуля")
+
+    def handle(self, *args, **options):
+        days = update_sales_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Сводки продаж пересчитаны за {days} дн."))
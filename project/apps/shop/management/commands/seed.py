@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from apps.users.models import User
 from apps.shop.models import Category, Product, CartItem, Order, OrderItem, Like, Review
+from apps.shop.likes import rebuild_like_counters
 from apps.articles.models import Article, Comment
 from django.contrib.contenttypes.models import ContentType
 from django.utils.text import slugify
@@ -109,6 +110,7 @@ class Command(BaseCommand):
                     name=name,
                     description=desc,
                     price=random.randint(30, 160),
+                    stock=random.randint(0, 50),
                     category=category,
                 )
                 products.append(product)
@@ -164,6 +166,7 @@ class Command(BaseCommand):
                     rating=random.randint(4, 5),
                     text=random.choice(review_texts)
                 )
+        Product.objects.refresh_ratings()
         self.stdout.write("✅ Отзывы созданы.")
 
         # --- Статьи ---
@@ -215,5 +218,6 @@ class Command(BaseCommand):
                         object_id=obj.id,
                         is_like=random.choice([True, False])
                     )
+        rebuild_like_counters()
         self.stdout.write("✅ Лайки добавлены.")
         self.stdout.write(self.style.SUCCESS("🎉 База успешно заполнена осмысленными данными!"))
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:03
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('russian', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce({row}description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B')
+"""
+
+CREATE_SQL = [
+    f"""
+    CREATE FUNCTION shop_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER shop_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON shop_product
+    FOR EACH ROW EXECUTE FUNCTION shop_product_search_vector_update();
+    """,
+    f"UPDATE shop_product SET search_vector = {SEARCH_VECTOR_SQL.format(row='')};",
+    "CREATE INDEX shop_product_search_idx ON shop_product USING gin (search_vector);",
+    "CREATE INDEX shop_product_name_trgm_idx ON shop_product USING gin (name gin_trgm_ops);",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS shop_product_name_trgm_idx;",
+    "DROP INDEX IF EXISTS shop_product_search_idx;",
+    "DROP TRIGGER IF EXISTS shop_product_search_vector_trigger ON shop_product;",
+    "DROP FUNCTION IF EXISTS shop_product_search_vector_update();",
+]
+
+
+def create_search_objects(apps, schema_editor):
+    # Триггер и GIN-индексы есть только в PostgreSQL, на SQLite поиск идёт через icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_product_rating'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    Like = apps.get_model('shop', 'Like')
+    LikeCounter = apps.get_model('shop', 'LikeCounter')
+    rows = Like.objects.values('content_type', 'object_id').order_by().annotate(
+        likes=Count('id', filter=Q(is_like=True)),
+        dislikes=Count('id', filter=Q(is_like=False)),
+    )
+    LikeCounter.objects.bulk_create([
+        LikeCounter(
+            content_type_id=row['content_type'],
+            object_id=row['object_id'],
+            likes=row['likes'],
+            dislikes=row['dislikes'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('shop', '0015_product_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('likes', models.PositiveIntegerField(default=0)),
+                ('dislikes', models.PositiveIntegerField(default=0)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id'), name='likecounter_object_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('shop', '0016_like_counter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['content_type', 'object_id', 'is_like'], name='like_object_vote_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='likecounter',
+            index=models.Index(fields=['content_type', '-likes', 'object_id'], name='likecounter_top_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_pending_events(apps, schema_editor):
+    # Для уже обработанных заказов время переходов неизвестно, поэтому журнал
+    # начинаем только у заказов, которые всё ещё ждут отправки
+    Order = apps.get_model('shop', 'Order')
+    OrderStatusEvent = apps.get_model('shop', 'OrderStatusEvent')
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(order_id=order_id, status='pending', created_at=created_at)
+        for order_id, created_at in Order.objects.filter(status='pending').values_list('id', 'created_at')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_order_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('canceled', 'Canceled')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='shop.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='orderevent_status_created_idx'), models.Index(fields=['order', 'created_at', 'id'], name='orderevent_order_created_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_pending_events, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from apps.users.models import User
 from django.db import models
+from django.db.models import Avg, Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 
 
 class Category(models.Model):
@@ -13,6 +17,54 @@ class Category(models.Model):
         return self.name
 
 
+RATING_STARS = (1, 2, 3, 4, 5)
+
+# Поля товара, которые меняются только условными UPDATE (apply_review, apps.shop.stock)
+# и не пишутся обычным save() из прочитанных ранее значений
+COUNTER_FIELDS = frozenset({'stock', 'rating_avg', 'rating_count', *(f'stars_{stars}' for stars in RATING_STARS)})
+
+
+class ProductQuerySet(models.QuerySet):
+    def apply_review(self, rating, delta):
+        """
+        Учитывает добавленный (delta=1) или удалённый (delta=-1) отзыв с оценкой
+        rating одним UPDATE по самим счётчикам, отзывы не читаются.
+        Средняя считается из stars_1..stars_5 до изменения плюс этот отзыв.
+        """
+        count = F('rating_count') + delta
+        total = sum((F(f'stars_{stars}') * stars for stars in RATING_STARS), Value(delta * rating))
+        return self.update(
+            rating_count=count,
+            **{f'stars_{rating}': F(f'stars_{rating}') + delta},
+            rating_avg=Case(
+                When(rating_count__gt=-delta, then=Cast(total, models.FloatField()) / count),
+                default=Value(0.0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+        )
+
+    def refresh_ratings(self):
+        """
+        Пересчитывает rating_avg, rating_count и stars_1..stars_5 по всем отзывам
+        одним UPDATE. Для команды rebuild_ratings; при записи отзывов — apply_review.
+        """
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+        def count(**filters):
+            value = Count('id', filter=Q(**filters)) if filters else Count('id')
+            return Coalesce(Subquery(reviews.annotate(value=value).values('value')), Value(0))
+
+        return self.update(
+            rating_avg=Coalesce(
+                Subquery(reviews.annotate(value=Avg('rating')).values('value')),
+                Value(0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+            rating_count=count(),
+            **{f'stars_{stars}': count(rating=stars) for stars in RATING_STARS},
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=150)
     description = models.TextField()
@@ -24,18 +76,70 @@ class Product(models.Model):
         blank=True,
         default='http://localhost:9000/products/default.jpg'
     )
+    # Меняется только условными UPDATE из apps.shop.stock, без чтения в Python;
+    # NULL — остаток не учитывается, товар продаётся без ограничений
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    # Заполняется триггером в PostgreSQL (см. миграцию 0011_product_search)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_avg', '-created_at'], name='product_rating_idx'),
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['category', '-created_at'], name='product_cat_created_idx'),
+            models.Index(fields=['category', 'price'], name='product_cat_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Сохранение существующего товара не перезаписывает счётчики (COUNTER_FIELDS)
+        # значениями, прочитанными до параллельных отзывов и заказов. Остальные
+        # поля — как у Django: все загруженные, отложенные не читаются и не пишутся
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.name not in COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def apply_review(self, rating, delta):
+        Product.objects.filter(pk=self.pk).apply_review(rating, delta)
+
+    def rating_histogram(self):
+        """Распределение оценок от 5 до 1: [(звёзды, количество, процент), ...]."""
+        histogram = []
+        for stars in reversed(RATING_STARS):
+            count = getattr(self, f'stars_{stars}')
+            percent = round(count * 100 / self.rating_count) if self.rating_count else 0
+            histogram.append((stars, count, percent))
+        return histogram
+
 
 class CartItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='cartitem_user_product_uniq'),
+        ]
+
     def get_total_price(self):
         return self.product.price * self.quantity
 
@@ -53,6 +157,31 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+            models.Index(
+                fields=['user'],
+                condition=models.Q(status='delivered'),
+                name='order_delivered_user_idx',
+            ),
+        ]
+
+
+class OrderStatusEvent(models.Model):
+    """Журнал переходов заказа между статусами. Строки только добавляются."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='orderevent_status_created_idx'),
+            models.Index(fields=['order', 'created_at', 'id'], name='orderevent_order_created_idx'),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -60,6 +189,11 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     buy_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ]
+
 
 class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
@@ -71,6 +205,10 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['product', '-created_at'], name='review_product_created_idx'),
+            models.Index(fields=['product', 'rating', 'created_at', 'id'], name='review_product_rating_idx'),
+        ]
 
 
 class Like(models.Model):
@@ -83,3 +221,63 @@ class Like(models.Model):
 
     class Meta:
         unique_together = ('user', 'content_type', 'object_id')
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'is_like'], name='like_object_vote_idx'),
+        ]
+
+
+class LikeCounter(models.Model):
+    """Число лайков и дизлайков объекта, поддерживается сервисом apps.shop.likes."""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    likes = models.PositiveIntegerField(default=0)
+    dislikes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='likecounter_object_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['content_type', '-likes', 'object_id'], name='likecounter_top_idx'),
+        ]
+
+
+class DailySales(models.Model):
+    """Продажи за день по всем заказам, кроме отменённых (строится apps.shop.rollups)."""
+    day = models.DateField(unique=True)
+    orders_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class DailyCategorySales(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    orders_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='dailycategorysales_day_category_uniq'),
+        ]
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    orders_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='dailyproductsales_day_product_uniq'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """До какого события журнала OrderStatusEvent сводка уже обработана."""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,121 @@
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import CartItem, Order, OrderItem, OrderStatusEvent
+from .reviews import invalidate_review_eligibility
+from .stock import release_stock, reserve_stock
+
+# Допустимые переходы: целевой статус -> статусы, из которых в него можно перейти
+ORDER_TRANSITIONS = {
+    'shipped': ('pending',),
+    'delivered': ('shipped',),
+    'canceled': ('pending', 'shipped'),
+}
+
+
+def order_total_subquery():
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return Coalesce(
+        Subquery(items.annotate(total=Sum(F('quantity') * F('buy_price'))).values('total')),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def order_items_count_subquery():
+    # Подзапрос, а не Count('items'): считается только для строк страницы, без GROUP BY
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), Value(0))
+
+
+def log_status(order_ids, status, at=None):
+    """Добавляет в журнал OrderStatusEvent переход в status для каждого заказа одним INSERT."""
+    at = at or timezone.now()
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(order_id=order_id, status=status, created_at=at) for order_id in order_ids
+    ])
+
+
+@transaction.atomic
+def place_order(user, cart_item_ids):
+    """
+    Оформляет заказ из выбранных позиций корзины. Возвращает заказ или None,
+    если позиций не осталось (например, их уже забрал параллельный checkout).
+
+    Если какого-то товара не хватает на складе, выбрасывает OutOfStock,
+    и ни заказ, ни корзина не меняются.
+
+    Число запросов не зависит от количества позиций: одно чтение строк
+    корзины с блокировкой, одно условное списание остатков, bulk_create
+    позиций заказа, сумма считается в БД.
+    """
+    rows = list(
+        CartItem.objects
+        .filter(id__in=cart_item_ids, user=user)
+        .select_for_update(of=('self',))
+        .values('id', 'product_id', 'quantity', 'product__price')
+    )
+    if not rows:
+        return None
+    reserve_stock({row['product_id']: row['quantity'] for row in rows})
+    order = Order.objects.create(user=user, total_price=0)
+    log_status([order.pk], order.status, at=order.created_at)
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product_id=row['product_id'],
+            quantity=row['quantity'],
+            buy_price=row['product__price'],
+        )
+        for row in rows
+    ])
+    Order.objects.filter(pk=order.pk).update(total_price=order_total_subquery())
+    CartItem.objects.filter(id__in=[row['id'] for row in rows]).delete()
+    return order
+
+
+@transaction.atomic
+def bulk_change_status(order_ids, status):
+    """
+    Переводит заказы в status одним UPDATE ... WHERE id IN (...) AND status IN (...)
+    по ORDER_TRANSITIONS. Возвращает {order_id: {'result', 'status'}}, где result —
+    'updated', 'skipped' (переход из текущего статуса запрещён) или 'not_found'.
+
+    Переходы пишутся в журнал OrderStatusEvent. UPDATE минует сигналы,
+    поэтому права на отзыв сбрасываются здесь же, а при отмене сразу
+    возвращаются на склад позиции отменённых заказов.
+    """
+    allowed_from = ORDER_TRANSITIONS.get(status)
+    if not allowed_from:
+        raise ValueError(f'Нельзя массово перевести заказы в статус {status!r}')
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids:
+        return {}
+    order_table = connection.ops.quote_name(Order._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {order_table} SET status = %s
+            WHERE id IN ({', '.join(['%s'] * len(order_ids))})
+              AND status IN ({', '.join(['%s'] * len(allowed_from))})
+            RETURNING id, user_id
+            """,
+            [status, *order_ids, *allowed_from],
+        )
+        updated = dict(cursor.fetchall())
+    log_status(updated, status)
+    outcomes = {order_id: {'result': 'updated', 'status': status} for order_id in updated}
+    rest = [order_id for order_id in order_ids if order_id not in updated]
+    if rest:
+        current = dict(Order.objects.filter(id__in=rest).values_list('id', 'status'))
+        for order_id in rest:
+            if order_id in current:
+                outcomes[order_id] = {'result': 'skipped', 'status': current[order_id]}
+            else:
+                outcomes[order_id] = {'result': 'not_found', 'status': None}
+    if status == 'delivered' and updated:
+        invalidate_review_eligibility(set(updated.values()))
+    if status == 'canceled' and updated:
+        release_stock(list(updated))
+    return outcomes
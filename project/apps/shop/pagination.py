@@ -0,0 +1,75 @@
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """Страница keyset-пагинации: объекты и курсор на следующую страницу."""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    """Возвращает значения ключа из курсора или None, если курсор пустой или битый."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        # encode_cursor пишет только строки; всё остальное — подделанный курсор
+        if not isinstance(values, list) or len(values) != len(fields) or not all(isinstance(v, str) for v in values):
+            return None
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)]
+    except (binascii.Error, TypeError, ValueError, ValidationError):
+        return None
+
+
+def _after(ordering, values):
+    """Условие "строго после курсора" для составного ключа сортировки."""
+    condition = Q()
+    for i, key in enumerate(ordering):
+        name = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_key, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_key.lstrip('-'): prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, per_page=12):
+    """
+    Отдаёт страницу без COUNT(*) и OFFSET: следующая страница выбирается
+    условием по последней строке предыдущей, поэтому любая страница стоит
+    как первая. Последний ключ в ordering должен быть уникальным (обычно id).
+    """
+    fields = [key.lstrip('-') for key in ordering]
+    qs = queryset.order_by(*ordering)
+    values = decode_cursor(cursor, queryset.model, fields)
+    if values is not None:
+        qs = qs.filter(_after(ordering, values))
+    items = list(qs[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor([getattr(items[-1], name) for name in fields])
+    return KeysetPage(items, next_cursor)
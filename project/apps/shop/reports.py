@@ -0,0 +1,74 @@
+from collections import defaultdict
+from django.db import connections
+from django.db.models import F, Window
+from django.db.models.functions import Lead
+from .models import OrderStatusEvent
+
+_POSTGRES_LATENCY_SQL = """
+    SELECT status,
+           count(*),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY duration),
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY duration)
+    FROM (
+        SELECT status,
+               LEAD(created_at) OVER (PARTITION BY order_id ORDER BY created_at, id) - created_at AS duration
+        FROM {table}
+        WHERE created_at >= %s
+    ) durations
+    WHERE duration IS NOT NULL
+    GROUP BY status
+"""
+
+
+def status_latency(since, using='default'):
+    """
+    Сколько заказы находятся в каждом статусе: {status: {'count', 'p50', 'p95'}},
+    p50/p95 — timedelta. Учитываются статусы, в которые заказ вошёл начиная
+    с since и из которых уже вышел. Читает только журнал OrderStatusEvent.
+
+    В PostgreSQL перцентили считает сама база (LEAD + percentile_cont),
+    на остальных СУБД длительности собираются оконной функцией и
+    перцентили считаются в Python.
+    """
+    if connections[using].vendor == 'postgresql':
+        return _postgres_latency(since, using)
+    return _fallback_latency(since, using)
+
+
+def _postgres_latency(since, using):
+    with connections[using].cursor() as cursor:
+        cursor.execute(_POSTGRES_LATENCY_SQL.format(table=OrderStatusEvent._meta.db_table), [since])
+        return {
+            status: {'count': count, 'p50': p50, 'p95': p95}
+            for status, count, p50, p95 in cursor.fetchall()
+        }
+
+
+def _percentile(values, fraction):
+    # Линейная интерполяция, как у percentile_cont
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _fallback_latency(since, using):
+    events = (
+        OrderStatusEvent.objects.using(using)
+        .filter(created_at__gte=since)
+        .annotate(left_at=Window(Lead('created_at'), partition_by=F('order_id'), order_by=[F('created_at'), F('id')]))
+        .values_list('status', 'created_at', 'left_at')
+    )
+    durations = defaultdict(list)
+    for status, entered_at, left_at in events:
+        if left_at is not None:
+            durations[status].append(left_at - entered_at)
+    result = {}
+    for status, values in durations.items():
+        values.sort()
+        result[status] = {
+            'count': len(values),
+            'p50': _percentile(values, 0.5),
+            'p95': _percentile(values, 0.95),
+        }
+    return result
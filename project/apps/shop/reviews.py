@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.utils import timezone
+from .likes import like_stats
+from .models import OrderItem, Review
+from .pagination import keyset_paginate
+
+ELIGIBILITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+REVIEWS_PER_PAGE = 10
+
+REVIEW_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'highest': ('-rating', '-created_at', '-id'),
+    'lowest': ('rating', 'created_at', 'id'),
+}
+
+
+def _eligibility_key(user_id):
+    return f'shop:review-eligibility:{user_id}'
+
+
+def review_eligibility(user):
+    """
+    Множества id товаров, которые пользователь получил (заказ доставлен)
+    и на которые уже оставил отзыв. Хранятся в кэше и пересчитываются
+    только после сброса (смена статуса заказа, создание или удаление отзыва).
+    """
+    key = _eligibility_key(user.pk)
+    eligibility = cache.get(key)
+    if eligibility is None:
+        eligibility = {
+            'delivered': set(
+                OrderItem.objects.filter(order__user=user, order__status='delivered')
+                .values_list('product_id', flat=True)
+                .distinct()
+            ),
+            'reviewed': set(Review.objects.filter(user=user).values_list('product_id', flat=True)),
+        }
+        cache.set(key, eligibility, ELIGIBILITY_CACHE_TIMEOUT)
+    return eligibility
+
+
+def can_review(user, product_id):
+    eligibility = review_eligibility(user)
+    return product_id in eligibility['delivered'] and product_id not in eligibility['reviewed']
+
+
+def invalidate_review_eligibility(user_ids):
+    cache.delete_many([_eligibility_key(user_id) for user_id in user_ids])
+
+
+def review_page(product, sort='newest', cursor=None):
+    """Страница отзывов товара с keyset-пагинацией в порядке sort."""
+    ordering = REVIEW_ORDERINGS.get(sort, REVIEW_ORDERINGS['newest'])
+    reviews = Review.objects.filter(product=product).select_related('user')
+    return keyset_paginate(reviews, ordering, cursor, REVIEWS_PER_PAGE)
+
+
+def serialize_review(review):
+    return {
+        'review_id': review.id,
+        'username': review.user.username,
+        'text': review.text,
+        'rating': review.rating,
+        'created_at': timezone.localtime(review.created_at).strftime('%d.%m.%Y %H:%M'),
+        **like_stats(review),
+    }
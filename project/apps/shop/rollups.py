@@ -0,0 +1,116 @@
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import (
+    DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem, OrderStatusEvent, RollupWatermark,
+)
+
+SALES_WATERMARK = 'daily_sales'
+
+# События моложе этого ещё могут принадлежать незакоммиченным транзакциям
+# с меньшими id, поэтому их разбирает следующий запуск
+SAFETY_LAG = timedelta(minutes=5)
+
+REVENUE = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return Q(order__created_at__gte=start, order__created_at__lt=start + timedelta(days=1))
+
+
+def _rollup_rows(items, *group_by):
+    return (
+        items.values('day', *group_by)
+        .annotate(
+            orders=Count('order', distinct=True),
+            items_quantity=Sum('quantity'),
+            items_revenue=Sum(F('quantity') * F('buy_price'), output_field=REVENUE),
+        )
+        .order_by()
+    )
+
+
+def rebuild_days(days=None):
+    """
+    Пересчитывает сводки за дни days (все дни, если None) по позициям
+    неотменённых заказов. День заказа — дата created_at в текущей таймзоне.
+    Строки за эти дни удаляются и вставляются заново, поэтому пересчёт
+    можно повторять сколько угодно раз.
+    """
+    items = OrderItem.objects.exclude(order__status='canceled').annotate(day=TruncDate('order__created_at'))
+    rollups = (DailySales, DailyCategorySales, DailyProductSales)
+    if days is not None:
+        days = sorted(set(days))
+        if not days:
+            return
+        items = items.filter(reduce(or_, map(_day_range, days)))
+        for model in rollups:
+            model.objects.filter(day__in=days).delete()
+    else:
+        for model in rollups:
+            model.objects.all().delete()
+
+    DailySales.objects.bulk_create([
+        DailySales(
+            day=row['day'], orders_count=row['orders'],
+            quantity=row['items_quantity'], revenue=row['items_revenue'],
+        )
+        for row in _rollup_rows(items)
+    ], batch_size=1000)
+    DailyCategorySales.objects.bulk_create([
+        DailyCategorySales(
+            day=row['day'], category_id=row['product__category'], orders_count=row['orders'],
+            quantity=row['items_quantity'], revenue=row['items_revenue'],
+        )
+        for row in _rollup_rows(items, 'product__category')
+    ], batch_size=1000)
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(
+            day=row['day'], product_id=row['product'], orders_count=row['orders'],
+            quantity=row['items_quantity'], revenue=row['items_revenue'],
+        )
+        for row in _rollup_rows(items, 'product')
+    ], batch_size=1000)
+
+
+@transaction.atomic
+def update_sales_rollups(full=False):
+    """
+    Обновляет дневные сводки продаж. Возвращает число пересчитанных дней.
+
+    Изменения заказов берутся из журнала OrderStatusEvent: пересчитываются
+    только дни заказов, у которых после водяного знака появились события.
+    Первый запуск и full=True перестраивают все сводки с нуля.
+    Строка водяного знака блокируется, так что параллельные запуски ждут друг друга.
+    """
+    watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=SALES_WATERMARK)
+    # Водяной знак не заходит в окно SAFETY_LAG и при полной перестройке:
+    # свежие события разберёт следующий запуск
+    settled = OrderStatusEvent.objects.filter(created_at__lt=timezone.now() - SAFETY_LAG)
+    if full or watermark.last_event_id is None:
+        upper = settled.aggregate(last=Max('id'))['last'] or 0
+        rebuild_days()
+        rebuilt = DailySales.objects.count()
+    else:
+        upper = settled.filter(id__gt=watermark.last_event_id).aggregate(last=Max('id'))['last']
+        if upper is None:
+            return 0
+        days = set(
+            Order.objects.filter(
+                status_events__id__gt=watermark.last_event_id, status_events__id__lte=upper,
+            )
+            .annotate(day=TruncDate('created_at'))
+            .values_list('day', flat=True)
+            .distinct()
+            .order_by()
+        )
+        rebuild_days(days)
+        rebuilt = len(days)
+    watermark.last_event_id = upper
+    watermark.save(update_fields=['last_event_id', 'updated_at'])
+    return rebuilt
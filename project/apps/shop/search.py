@@ -0,0 +1,43 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+SEARCH_CONFIGS = ('russian', 'english')
+
+
+def search_products(queryset, query):
+    """
+    Фильтрует товары по поисковой строке и добавляет аннотацию rank.
+
+    В PostgreSQL ищет по search_vector (русская и английская морфология)
+    и по триграммам названия, чтобы находились товары с опечатками.
+    На остальных СУБД (SQLite в тестах) работает через icontains.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        return _postgres_search(queryset, query)
+    return _fallback_search(queryset, query)
+
+
+def _postgres_search(queryset, query):
+    search_query = None
+    for config in SEARCH_CONFIGS:
+        part = SearchQuery(query, config=config, search_type='websearch')
+        search_query = part if search_query is None else search_query | part
+    return queryset.filter(
+        Q(search_vector=search_query) | Q(name__trigram_similar=query)
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query) + TrigramSimilarity('name', query),
+    )
+
+
+def _fallback_search(queryset, query):
+    condition = Q()
+    for term in query.split():
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition).annotate(
+        rank=Case(
+            When(name__icontains=query, then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .caching import CATALOG, CATEGORIES, bump_version, product_namespace
+from .cart import invalidate_cart_summaries
+from .models import CartItem, Category, Order, Product, Review
+from .reviews import invalidate_review_eligibility
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    bump_version(product_namespace(instance.pk))
+    bump_version(CATALOG)
+
+
+@receiver([post_save, pre_delete], sender=Product)
+def product_carts_changed(sender, instance, created=False, **kwargs):
+    # Сводка корзины зависит от цены товара и исчезает вместе с ним
+    if not created:
+        user_ids = CartItem.objects.filter(product=instance).values_list('user_id', flat=True)
+        invalidate_cart_summaries(set(user_ids))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_version(CATEGORIES)
+    bump_version(CATALOG)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, **kwargs):
+    # Страницы сбрасываются после коммита, когда счётчики рейтинга товара
+    # уже обновлены той же транзакцией (apply_review)
+    product_id = instance.product_id
+    transaction.on_commit(lambda: [bump_version(product_namespace(product_id)), bump_version(CATALOG)])
+    invalidate_review_eligibility([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, created=False, **kwargs):
+    # Доставленные заказы открывают возможность оставить отзыв;
+    # новый заказ в статусе pending на это не влияет
+    if not created or instance.status == 'delivered':
+        invalidate_review_eligibility([instance.user_id])
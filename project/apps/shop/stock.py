@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from .models import OrderItem, Product
+
+
+class OutOfStock(Exception):
+    """Не хватает остатка; products — названия товаров, которых не хватило."""
+
+    def __init__(self, products):
+        super().__init__(', '.join(products))
+        self.products = products
+
+
+class _Shortage(Exception):
+    pass
+
+
+def _amounts(quantities):
+    # CASE id WHEN ... THEN n — своё количество для каждой строки одного UPDATE
+    return Case(
+        *(When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def reserve_stock(quantities):
+    """
+    Списывает остатки {product_id: количество} одним
+    UPDATE ... SET stock = stock - n WHERE stock >= n по всем позициям.
+    Если хоть одной позиции не хватает, списание откатывается целиком
+    и выбрасывается OutOfStock. Параллельные заказы не уводят остаток
+    в минус: условие перепроверяется под блокировкой строки.
+    Товары без учёта остатка (stock IS NULL) проходят без ограничений.
+    """
+    if not quantities:
+        return
+    amount = _amounts(quantities)
+    try:
+        with transaction.atomic():
+            reserved = (
+                Product.objects.filter(Q(stock__isnull=True) | Q(stock__gte=amount), id__in=quantities)
+                .update(stock=F('stock') - amount)
+            )
+            if reserved != len(quantities):
+                raise _Shortage
+    except _Shortage:
+        raise OutOfStock(_shortages(quantities))
+
+
+def _shortages(quantities):
+    # Товар мог быть удалён после того, как попал в корзину, — называем его по id
+    found = {
+        product_id: (name, stock)
+        for product_id, name, stock in Product.objects.filter(id__in=quantities).values_list('id', 'name', 'stock')
+    }
+    shortages = []
+    for product_id, quantity in quantities.items():
+        if product_id not in found:
+            shortages.append(f'товар #{product_id} (снят с продажи)')
+            continue
+        name, stock = found[product_id]
+        if stock is not None and stock < quantity:
+            shortages.append(name)
+    return shortages
+
+
+def release_stock(order_ids):
+    """Возвращает на склад позиции заказов order_ids одним UPDATE."""
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values('product_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    quantities = {row['product_id']: row['quantity'] for row in rows}
+    if quantities:
+        Product.objects.filter(id__in=quantities).update(stock=F('stock') + _amounts(quantities))
+
+
+def restock(product_id, quantity):
+    """
+    Поступление товара: stock = stock + quantity без чтения текущего значения.
+    Товар без учёта остатка начинает учитываться с quantity.
+    """
+    Product.objects.filter(pk=product_id).update(stock=Coalesce(F('stock'), 0) + quantity)
@@ -1,3 +1,998 @@
-from django.test import TestCase
+import base64
+import json
+from io import StringIO
+from unittest import mock, skipUnless
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from datetime import timedelta
+from decimal import Decimal
+from django.utils import timezone
+from apps.users.models import User
+from apps.articles.models import Article, Comment
+from .cart import add_to_cart, cart_summary, toggle_cart_item
+from .likes import attach_likes, rebuild_like_counters
+from .orders import bulk_change_status, place_order
+from .pagination import decode_cursor, encode_cursor
+from .reports import status_latency
+from .rollups import SALES_WATERMARK, update_sales_rollups
+from .reviews import can_review
+from .search import search_products
+from .stock import OutOfStock, reserve_stock
+from .views import RATINGS_BATCH_LIMIT
+from .models import (
+    RATING_STARS, Category, Product, CartItem, Order, OrderItem, OrderStatusEvent, Review, Like, LikeCounter,
+    DailySales, DailyCategorySales, DailyProductSales, RollupWatermark,
+)
 
-# Create your tests here.
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN-планы проверяются только на PostgreSQL')
+class HotQueryIndexTests(TestCase):
+    """Горячие запросы магазина должны обслуживаться индексами, а не Seq Scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([User(username=f'user{i}') for i in range(20)])
+        cls.categories = Category.objects.bulk_create([
+            Category(name=f'Категория {i}', slug=f'category-{i}') for i in range(5)
+        ])
+        cls.products = Product.objects.bulk_create([
+            Product(
+                name=f'Товар {i}',
+                description='Описание',
+                price=10 + i % 150,
+                category=cls.categories[i % 5],
+            )
+            for i in range(500)
+        ])
+        CartItem.objects.bulk_create([
+            CartItem(user=user, product=cls.products[(u * 7 + j) % 500])
+            for u, user in enumerate(cls.users) for j in range(5)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=user, status=('pending', 'shipped', 'delivered')[(u + j) % 3], total_price=0)
+            for u, user in enumerate(cls.users) for j in range(10)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=cls.products[(o * 3 + j) % 500], quantity=1, buy_price=10)
+            for o, order in enumerate(orders) for j in range(3)
+        ])
+        Review.objects.bulk_create([
+            Review(user=user, product=cls.products[(u * 11 + j) % 500], rating=5, text='Отлично')
+            for u, user in enumerate(cls.users) for j in range(10)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        # На небольшом наборе данных планировщик и так предпочтёт Seq Scan,
+        # поэтому проверяем, что индекс вообще может быть использован.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+        self.assertIn('Index', plan, plan)
+
+    def test_cart_item_by_user_and_product(self):
+        self.assertUsesIndex(CartItem.objects.filter(user=self.users[0], product=self.products[0]))
+
+    def test_delivered_order_items_by_user_and_product(self):
+        self.assertUsesIndex(OrderItem.objects.filter(
+            order__user=self.users[0],
+            product=self.products[0],
+            order__status='delivered',
+        ))
+
+    def test_orders_by_user_newest_first(self):
+        self.assertUsesIndex(Order.objects.filter(user=self.users[0]).order_by('-created_at'))
+
+    def test_order_list_orderings(self):
+        self.assertUsesIndex(Order.objects.order_by('-created_at', '-id')[:20])
+        self.assertUsesIndex(Order.objects.filter(status='pending').order_by('-created_at', '-id')[:20])
+
+    def test_status_events_by_status_and_time(self):
+        self.assertUsesIndex(OrderStatusEvent.objects.filter(
+            status='pending', created_at__gte=timezone.now() - timedelta(days=1),
+        ))
+
+    def test_products_by_category_newest_first(self):
+        self.assertUsesIndex(Product.objects.filter(category=self.categories[0]).order_by('-created_at')[:12])
+
+    def test_products_by_category_and_price(self):
+        self.assertUsesIndex(Product.objects.filter(
+            category=self.categories[0], price__gte=50,
+        ).order_by('price')[:12])
+
+    def test_catalog_keyset_orderings(self):
+        self.assertUsesIndex(Product.objects.order_by('-created_at', '-id')[:12])
+        self.assertUsesIndex(Product.objects.order_by('price', 'id')[:12])
+        self.assertUsesIndex(Product.objects.order_by('-rating_avg', '-created_at')[:12])
+
+    def test_reviews_by_product_newest_first(self):
+        self.assertUsesIndex(Review.objects.filter(product=self.products[0]).order_by('-created_at'))
+
+    def test_like_counts_and_top_liked(self):
+        content_type = ContentType.objects.get_for_model(Review)
+        self.assertUsesIndex(Like.objects.filter(content_type=content_type, object_id=1, is_like=True))
+        self.assertUsesIndex(
+            LikeCounter.objects.filter(content_type=content_type, likes__gt=0)
+            .order_by('-likes', 'object_id').values_list('object_id', flat=True)[:5]
+        )
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.rated, cls.unrated = Product.objects.bulk_create([
+            Product(name='Whey', description='-', price=50, category=category),
+            Product(name='Casein', description='-', price=40, category=category, rating_avg=5, rating_count=3),
+        ])
+        users = User.objects.bulk_create([User(username=f'reviewer{i}') for i in range(3)])
+        Review.objects.bulk_create([
+            Review(user=user, product=cls.rated, rating=rating, text='-') for user, rating in zip(users, [5, 3, 3])
+        ])
+
+    def test_rebuild_ratings_recomputes_aggregates(self):
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.rated.refresh_from_db()
+        self.unrated.refresh_from_db()
+        self.assertEqual((self.rated.rating_avg, self.rated.rating_count), (Decimal('3.67'), 3))
+        self.assertEqual(self.rated.rating_histogram(), [(5, 1, 33), (4, 0, 0), (3, 2, 67), (2, 0, 0), (1, 0, 0)])
+        # Товар без отзывов сбрасывается в ноль
+        self.assertEqual((self.unrated.rating_avg, self.unrated.rating_count), (0, 0))
+
+    def test_best_reviews_sort_uses_stored_rating(self):
+        Product.objects.refresh_ratings()
+        cache.clear()
+        response = self.client.get(reverse('shop:products'), {'sort': 'best_reviews'})
+        self.assertEqual([product.name for product in response.context['products']], ['Whey', 'Casein'])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        # Повторяющиеся цены: порядок между ними держится на id
+        Product.objects.bulk_create([
+            Product(name=f'Товар {i}', description='-', price=10 + i % 4, category=category) for i in range(30)
+        ])
+
+    def test_cursor_round_trip(self):
+        product = Product.objects.first()
+        fields = ['created_at', 'price', 'id']
+        cursor = encode_cursor([getattr(product, name) for name in fields])
+        self.assertEqual(decode_cursor(cursor, Product, fields), [product.created_at, product.price, product.id])
+        self.assertIsNone(decode_cursor('не-курсор', Product, fields))
+        self.assertIsNone(decode_cursor(encode_cursor([1]), Product, fields))
+
+    def test_tampered_cursor_gives_first_page(self):
+        first = self.client.get(reverse('shop:products_feed')).json()['products']
+        # Сортировка по умолчанию — (-created_at, -id)
+        for values in ([None, None], [1, 2], [[1], [1]], ['2026-01-01T00:00:00', None], ['x', 'y']):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            response = self.client.get(reverse('shop:products_feed'), {'cursor': cursor})
+            self.assertEqual(response.json()['products'], first, values)
+            self.assertEqual(self.client.get(reverse('shop:products'), {'cursor': cursor}).status_code, 200)
+
+    def test_feed_walks_catalog_without_gaps(self):
+        url = reverse('shop:products_feed')
+        pages, cursor = [], ''
+        while True:
+            data = self.client.get(url, {'sort': 'price_asc', 'cursor': cursor}).json()
+            pages.append(data['products'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual([len(page) for page in pages], [12, 12, 6])
+        feed = [(item['price'], item['id']) for page in pages for item in page]
+        self.assertEqual(feed, sorted(feed))
+        self.assertEqual(len(set(feed)), 30)
+        self.assertEqual(set(pages[0][0]), {'id', 'name', 'price', 'category', 'image', 'rating_avg', 'url'})
+
+
+@skipUnless(connection.vendor != 'postgresql', 'Запасной поиск через icontains работает вне PostgreSQL')
+class FallbackSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        Product.objects.bulk_create([
+            Product(name='Casein Night', description='Медленный белок', price=40, category=category),
+            Product(name='Whey Gold', description='Быстрый белок, вкус шоколад', price=50, category=category),
+            Product(name='Батончик шоколадный', description='Whey внутри', price=5, category=category),
+        ])
+
+    def test_all_terms_must_match_name_or_description(self):
+        names = search_products(Product.objects.all(), 'whey шоколад').values_list('name', flat=True)
+        self.assertEqual(set(names), {'Whey Gold', 'Батончик шоколадный'})
+        self.assertFalse(search_products(Product.objects.all(), 'whey казеин').exists())
+
+    def test_catalog_ranks_name_matches_first(self):
+        cache.clear()
+        response = self.client.get(reverse('shop:products'), {'q': 'whey'})
+        self.assertEqual(response.context['sort'], 'relevance')
+        self.assertEqual([product.name for product in response.context['products']], ['Whey Gold', 'Батончик шоколадный'])
+
+
+class CatalogFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        proteins = Category.objects.create(name='Протеины', slug='proteins')
+        amino = Category.objects.create(name='Аминокислоты', slug='amino')
+        Product.objects.bulk_create([
+            Product(name=f'Товар {price}', description='-', price=price, category=category)
+            for price, category in [
+                (30, proteins), (50, proteins), ('99.99', proteins), (100, amino), (150, amino), (50, amino),
+            ]
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def results(self, query):
+        return len(self.client.get(f"{reverse('shop:products')}?{query}").context['products'].object_list)
+
+    def test_bucket_counts_match_bucket_links(self):
+        facets = self.client.get(reverse('shop:products'), {'category': 'proteins'}).context['facets']
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 2, 0, 0])
+        for bucket in facets['price']:
+            self.assertEqual(self.results(bucket['query']), bucket['count'], bucket['query'])
+
+    def test_all_categories_count_ignores_category_filter(self):
+        response = self.client.get(reverse('shop:products'), {'category': 'proteins', 'price_min': 50})
+        facets = response.context['facets']
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['all_categories'], 5)
+        self.assertEqual(sum(facets['categories'].values()), facets['all_categories'])
+        self.assertContains(response, '(5)')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.product = Product.objects.create(name='Whey', description='Протеин', price=50, category=cls.category)
+        cls.user = User.objects.create_user(username='reviewer')
+
+    def setUp(self):
+        cache.clear()
+        ContentType.objects.get_for_model(Review)
+        self.urls = [reverse('shop:product', args=[self.product.pk]), reverse('shop:products')]
+
+    def assertCached(self, cached):
+        for url in self.urls:
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertEqual(len(queries) == 0, cached, url)
+
+    def assertInvalidates(self, change):
+        for url in self.urls:
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        for url in self.urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertContains(self.client.get(url), 'Whey')
+            self.assertTrue(queries, url)
+
+    def test_pages_are_cached_for_anonymous_only(self):
+        self.assertCached(True)
+        self.client.force_login(self.user)
+        self.assertCached(False)
+
+    def test_product_save_invalidates(self):
+        def change():
+            self.product.price = 55
+            self.product.save()
+        self.assertInvalidates(change)
+
+    def test_category_save_invalidates(self):
+        def change():
+            self.category.name = 'Белки'
+            self.category.save()
+        self.assertInvalidates(change)
+
+    def test_review_save_invalidates(self):
+        self.assertInvalidates(
+            lambda: Review.objects.create(user=self.user, product=self.product, rating=5, text='Отлично')
+        )
+
+    def test_cached_page_gets_new_rating(self):
+        order = Order.objects.create(user=self.user, status='delivered', total_price=50)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, buy_price=50)
+        url = reverse('shop:product', args=[self.product.pk])
+        self.client.get(url)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(
+                reverse('shop:add_review_ajax', args=[self.product.pk]),
+                json.dumps({'text': 'Отлично', 'rating': 4}),
+                content_type='application/json',
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+        # Версии страниц сбрасываются только после коммита вместе со счётчиками
+        self.assertEqual(len(callbacks), 1)
+        self.client.logout()
+        self.assertContains(self.client.get(url), 'отзывов: 1')
+
+
+class ProductDetailQueryTests(TestCase):
+    """Число запросов страницы товара не должно расти вместе с отзывами и функциями."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.product = Product.objects.create(name='Whey', description='Протеин', price=50, category=category)
+        cls.user = User.objects.create_user(username='buyer', password='secret')
+        reviewers = User.objects.bulk_create([User(username=f'reviewer{i}') for i in range(10)])
+        Review.objects.bulk_create([
+            Review(user=reviewer, product=cls.product, rating=4, text='Хорошо') for reviewer in reviewers
+        ])
+        order = Order.objects.create(user=cls.user, status='delivered', total_price=50)
+        OrderItem.objects.create(order=order, product=cls.product, quantity=1, buy_price=50)
+        CartItem.objects.create(user=cls.user, product=cls.product)
+
+    def setUp(self):
+        cache.clear()
+        # ContentType кэшируется на весь процесс, в тестах прогреваем явно
+        ContentType.objects.get_for_model(Review)
+
+    def test_anonymous(self):
+        # товар с категорией и признаками + отзывы с авторами + лайки отзывов
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('shop:product', args=[self.product.pk]))
+        self.assertEqual(len(response.context['reviews']), 10)
+
+    def test_authenticated(self):
+        self.client.force_login(self.user)
+        url = reverse('shop:product', args=[self.product.pk])
+        # сессия, пользователь, товар, отзывы, лайки отзывов + заполнение кэшей
+        # права на отзыв (два запроса) и сводки корзины (один запрос)
+        with self.assertNumQueries(8):
+            response = self.client.get(url)
+        self.assertTrue(response.context['in_cart'])
+        self.assertTrue(response.context['can_review'])
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+
+class RatingCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.product = Product.objects.create(name='Whey', description='Протеин', price=50, category=category)
+        cls.users = User.objects.bulk_create([User(username=f'buyer{i}') for i in range(4)])
+
+    def counters(self):
+        return Product.objects.filter(pk=self.product.pk).values(
+            'rating_avg', 'rating_count', *(f'stars_{stars}' for stars in RATING_STARS),
+        ).get()
+
+    def test_review_writes_update_counters_incrementally(self):
+        for user, rating in zip(self.users, [5, 4, 4, 2]):
+            review = Review.objects.create(user=user, product=self.product, rating=rating, text='-')
+            with self.assertNumQueries(1):
+                self.product.apply_review(rating, 1)
+        counters = self.counters()
+        self.assertEqual((counters['rating_count'], counters['stars_4'], counters['rating_avg']), (4, 2, Decimal('3.75')))
+
+        review.delete()
+        Product.objects.filter(pk=self.product.pk).apply_review(2, -1)
+        counters = self.counters()
+        self.assertEqual(counters['rating_avg'], Decimal('4.33'))
+        Product.objects.refresh_ratings()
+        self.assertEqual(self.counters(), counters)
+
+        Review.objects.all().delete()
+        for rating in (5, 4, 4):
+            Product.objects.filter(pk=self.product.pk).apply_review(rating, -1)
+        self.assertEqual((self.counters()['rating_count'], self.counters()['rating_avg']), (0, 0))
+
+    def test_ratings_endpoint_caps_ids(self):
+        products = Product.objects.bulk_create([
+            Product(name=f'Товар {i}', description='-', price=10, category=self.product.category, stars_5=1, rating_count=1)
+            for i in range(RATINGS_BATCH_LIMIT + 5)
+        ])
+        ids = ','.join(str(product.pk) for product in products)
+        with self.assertNumQueries(1):
+            ratings = self.client.get(reverse('shop:product_ratings'), {'ids': f'{ids},abc'}).json()['ratings']
+        self.assertEqual(len(ratings), RATINGS_BATCH_LIMIT)
+        self.assertEqual(ratings[str(products[0].pk)]['histogram'], {'1': 0, '2': 0, '3': 0, '4': 0, '5': 1})
+
+
+class ReviewFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Креатины', slug='creatine')
+        cls.product = Product.objects.create(name='Creatine', description='Креатин', price=30, category=category)
+        users = User.objects.bulk_create([User(username=f'reviewer{i}') for i in range(25)])
+        Review.objects.bulk_create([
+            Review(user=user, product=cls.product, rating=i % 5 + 1, text=f'Отзыв {i}')
+            for i, user in enumerate(users)
+        ])
+
+    def fetch_all(self, sort):
+        url = reverse('shop:product_reviews', args=[self.product.pk])
+        ratings, cursor = [], ''
+        while True:
+            data = self.client.get(url, {'sort': sort, 'cursor': cursor}).json()
+            ratings += [review['rating'] for review in data['reviews']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return ratings
+
+    def test_pages_cover_all_reviews_in_order(self):
+        self.assertEqual(len(self.fetch_all('newest')), 25)
+        self.assertEqual(self.fetch_all('highest'), sorted(self.fetch_all('highest'), reverse=True))
+        self.assertEqual(self.fetch_all('lowest'), sorted(self.fetch_all('lowest')))
+        self.assertEqual(len(self.fetch_all('lowest')), 25)
+
+
+class CartSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret')
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.whey, cls.casein = Product.objects.bulk_create([
+            Product(name='Whey', description='-', price=50, category=category),
+            Product(name='Casein', description='-', price=30, category=category),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_counter_is_served_from_cache(self):
+        self.client.post(reverse('shop:to_cart', args=[self.whey.pk]))
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_summary(self.user), {'count': 1, 'total': 50})
+        response = self.client.get(reverse('shop:cart'))
+        self.assertContains(response, '<span id="cart-count">(1)</span>', html=True)
+
+    def test_mutations_answer_with_one_totals_query(self):
+        item = CartItem.objects.create(user=self.user, product=self.whey, quantity=1)
+        CartItem.objects.create(user=self.user, product=self.casein, quantity=2)
+        url = reverse('shop:cart_quantity', args=[item.pk])
+        # сессия, пользователь, UPDATE позиции, сводка корзины вместе с позицией
+        with self.assertNumQueries(4):
+            data = self.client.post(url, {'action': 'plus'}).json()
+        self.assertEqual(
+            (data['quantity'], data['item_total'], data['cart_total'], data['cart_item_count']), (2, 100.0, 160.0, 2),
+        )
+        data = self.client.post(url, {'action': 'minus'}).json()
+        self.assertEqual((data['quantity'], data['item_total'], data['cart_total']), (1, 50.0, 110.0))
+        data = self.client.post(url, {'action': 'minus'}).json()
+        self.assertEqual((data['deleted'], data['cart_total'], data['cart_item_count']), (True, 60.0, 1))
+
+        other = CartItem.objects.get()
+        data = self.client.post(reverse('shop:from_cart', args=[other.pk])).json()
+        self.assertEqual((data['cart_total'], data['cart_item_count']), (0.0, 0))
+        self.assertEqual(self.client.post(url, {'action': 'plus'}).status_code, 404)
+
+    def test_cart_page_line_totals(self):
+        CartItem.objects.create(user=self.user, product=self.casein, quantity=3)
+        response = self.client.get(reverse('shop:cart'))
+        self.assertEqual([item.line_total for item in response.context['cart_items']], [90])
+        self.assertEqual(response.context['cart_total'], 90)
+
+    def test_price_change_resets_summary(self):
+        CartItem.objects.create(user=self.user, product=self.whey, quantity=2)
+        self.assertEqual(cart_summary(self.user)['total'], 100)
+        self.whey.price = 45
+        self.whey.save()
+        self.assertEqual(cart_summary(self.user)['total'], 90)
+
+
+class CartUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret')
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.product = Product.objects.create(name='Whey', description='-', price=50, category=category)
+
+    def test_add_merges_into_one_row(self):
+        for _ in range(3):
+            self.assertTrue(add_to_cart(self.user, self.product.pk))
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [3])
+        self.assertFalse(add_to_cart(self.user, self.product.pk + 100))
+
+    def test_toggle(self):
+        self.assertEqual(toggle_cart_item(self.user, self.product.pk), 'added')
+        self.assertEqual(toggle_cart_item(self.user, self.product.pk), 'removed')
+        self.assertFalse(CartItem.objects.exists())
+        self.assertIsNone(toggle_cart_item(self.user, self.product.pk + 100))
+
+    def test_toggle_loses_race_to_concurrent_add(self):
+        CartItem.objects.create(user=self.user, product=self.product)
+        # Параллельный запрос вставил строку уже после нашего DELETE
+        with mock.patch('django.db.models.query.QuerySet.delete', return_value=(0, {})):
+            self.assertEqual(toggle_cart_item(self.user, self.product.pk), 'added')
+        self.assertEqual(CartItem.objects.count(), 1)
+
+
+class CartDuplicateMigrationTests(TransactionTestCase):
+    """Миграция 0012 сливает дубли позиций корзины перед уникальным ограничением."""
+
+    before = [('shop', '0011_product_search')]
+    after = [('shop', '0012_cartitem_user_product_uniq')]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        user = old_apps.get_model('users', 'User').objects.create(username='buyer')
+        category = old_apps.get_model('shop', 'Category').objects.create(name='Протеины', slug='proteins')
+        Product = old_apps.get_model('shop', 'Product')
+        whey, casein = (
+            Product.objects.create(name=name, description='-', price=50, category=category) for name in ('Whey', 'Casein')
+        )
+        OldCartItem = old_apps.get_model('shop', 'CartItem')
+        OldCartItem.objects.bulk_create([
+            OldCartItem(user=user, product=whey, quantity=1),
+            OldCartItem(user=user, product=whey, quantity=2),
+            OldCartItem(user=user, product=casein, quantity=4),
+        ])
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        new_apps = executor.loader.project_state(self.after).apps
+        rows = new_apps.get_model('shop', 'CartItem').objects.order_by('product__name').values_list('product__name', 'quantity')
+        self.assertEqual(list(rows), [('Casein', 4), ('Whey', 3)])
+
+
+class ReviewEligibilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='manager', password='secret', is_staff=True)
+        cls.customer = User.objects.create_user(username='customer', password='secret')
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.product = Product.objects.create(name='Whey', description='Протеин', price=50, category=category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_delivery_and_reviews_reset_cached_eligibility(self):
+        order = Order.objects.create(user=self.customer, status='shipped', total_price=50)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, buy_price=50)
+        self.assertFalse(can_review(self.customer, self.product.pk))
+
+        bulk_change_status([order.pk], 'delivered')
+        with self.assertNumQueries(2):
+            self.assertTrue(can_review(self.customer, self.product.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(can_review(self.customer, self.product.pk))
+
+        review = Review.objects.create(user=self.customer, product=self.product, rating=5, text='Отлично')
+        self.assertFalse(can_review(self.customer, self.product.pk))
+        review.delete()
+        self.assertTrue(can_review(self.customer, self.product.pk))
+
+    def test_status_change_view_resets_eligibility(self):
+        order = Order.objects.create(user=self.customer, status='shipped', total_price=50)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, buy_price=50)
+        self.assertFalse(can_review(self.customer, self.product.pk))
+        self.client.force_login(self.staff)
+        self.client.post(reverse('shop:change_order_status', args=[order.pk]), {'status': 'delivered'})
+        self.assertTrue(can_review(self.customer, self.product.pk))
+
+
+class LikeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.article = Article.objects.create(title='Креатин', content='Текст', slug='creatine')
+        cls.comments = Comment.objects.bulk_create([
+            Comment(user=cls.user, article=cls.article, text=f'Комментарий {i}') for i in range(5)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def toggle(self, kind, obj, is_like):
+        url = reverse('shop:toggle_like', args=[kind, obj.pk])
+        return self.client.post(url, {'is_like': '1' if is_like else '0'}).json()
+
+    def test_toggle_switch_and_remove(self):
+        comment = self.comments[0]
+        self.assertEqual(self.toggle('comment', comment, True), {'likes': 1, 'dislikes': 0, 'user_vote': True})
+        self.assertEqual(self.toggle('comment', comment, False), {'likes': 0, 'dislikes': 1, 'user_vote': False})
+        self.assertEqual(self.toggle('comment', comment, False), {'likes': 0, 'dislikes': 0, 'user_vote': None})
+        self.assertFalse(Like.objects.exists())
+
+    def test_unknown_kind(self):
+        url = reverse('shop:toggle_like', args=['user', self.user.pk])
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+    def test_attach_likes_one_query_per_type(self):
+        voters = User.objects.bulk_create([User(username=f'voter{i}') for i in range(3)])
+        for voter in voters:
+            self.client.force_login(voter)
+            self.toggle('comment', self.comments[1], True)
+            self.toggle('article', self.article, False)
+        self.toggle('comment', self.comments[2], False)
+
+        objects = [Article.objects.get(), *Comment.objects.order_by('id')]
+        ContentType.objects.get_for_models(Article, Comment)
+        with self.assertNumQueries(2):
+            attach_likes(objects, voters[-1])
+        article, *comments = objects
+        self.assertEqual((article.likes, article.dislikes, article.user_vote), (0, 3, False))
+        self.assertEqual((comments[1].likes, comments[1].user_vote), (3, True))
+        self.assertEqual((comments[2].dislikes, comments[2].user_vote), (1, False))
+        self.assertEqual((comments[0].likes, comments[0].user_vote), (0, None))
+
+    def test_rebuild_matches_toggles(self):
+        self.toggle('comment', self.comments[0], True)
+        self.toggle('article', self.article, True)
+        expected = set(LikeCounter.objects.values_list('object_id', 'likes', 'dislikes'))
+        LikeCounter.objects.update(likes=0)
+        self.assertEqual(rebuild_like_counters(), 2)
+        self.assertEqual(set(LikeCounter.objects.values_list('object_id', 'likes', 'dislikes')), expected)
+
+    def test_top_liked_articles(self):
+        articles = [self.article, *Article.objects.bulk_create([
+            Article(title=f'Статья {i}', content='Текст', slug=f'article-{i}') for i in range(3)
+        ])]
+        voters = User.objects.bulk_create([User(username=f'fan{i}') for i in range(3)])
+        for votes, article in zip([1, 3, 0, 2], articles):
+            for voter in voters[:votes]:
+                self.client.force_login(voter)
+                self.toggle('article', article, True)
+        response = self.client.get(reverse('articles:articles'))
+        self.assertEqual(response.context['popular_articles'], [articles[1], articles[3], articles[0]])
+
+
+class OrderListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='manager', password='secret', is_staff=True)
+        cls.customers = User.objects.bulk_create([User(username=f'customer{i}') for i in range(3)])
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        product = Product.objects.create(name='Whey', description='Протеин', price=50, category=category)
+        orders = Order.objects.bulk_create([
+            Order(user=cls.customers[i % 3], status=('pending', 'shipped')[i % 2], total_price=50)
+            for i in range(45)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, buy_price=50)
+            for i, order in enumerate(orders) for _ in range(i % 4 + 1)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch_all(self, params=None):
+        url = reverse('shop:order_list')
+        params, orders = dict(params or {}), []
+        while True:
+            response = self.client.get(url, params)
+            orders += list(response.context['orders'])
+            if not response.context['orders'].has_next:
+                return orders
+            params['cursor'] = response.context['orders'].next_cursor
+
+    def test_staff_pages_cover_all_orders_newest_first(self):
+        self.client.force_login(self.staff)
+        orders = self.fetch_all()
+        self.assertEqual(len(orders), 45)
+        keys = [(order.created_at, order.id) for order in orders]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(
+            {order.id: order.items_count for order in orders},
+            {order.id: order.items.count() for order in Order.objects.all()},
+        )
+
+    def test_filters(self):
+        self.client.force_login(self.staff)
+        orders = self.fetch_all({'status': 'pending', 'user': 'customer0'})
+        self.assertTrue(orders)
+        self.assertTrue(all(o.status == 'pending' and o.user_id == self.customers[0].pk for o in orders))
+        today = timezone.localdate().isoformat()
+        self.assertEqual(len(self.fetch_all({'date_from': today, 'date_to': today})), 45)
+        self.assertEqual(self.fetch_all({'date_to': '2000-01-01'}), [])
+
+    def test_customer_sees_only_own_orders(self):
+        self.client.force_login(self.customers[1])
+        orders = self.fetch_all({'user': 'customer0'})
+        self.assertEqual(len(orders), 15)
+        self.assertTrue(all(order.user_id == self.customers[1].pk for order in orders))
+
+    def test_page_query_count(self):
+        self.client.force_login(self.staff)
+        # сессия, пользователь, страница заказов с числом позиций, сводка корзины в шапке
+        with self.assertNumQueries(4):
+            self.client.get(reverse('shop:order_list'))
+
+
+class BulkOrderStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='manager', password='secret', is_staff=True)
+        cls.customer = User.objects.create_user(username='customer', password='secret')
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.product = Product.objects.create(name='Whey', description='Протеин', price=50, category=category)
+        cls.orders = Order.objects.bulk_create([
+            Order(user=cls.customer, status=('pending', 'shipped', 'delivered')[i % 3], total_price=50)
+            for i in range(300)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=cls.product, quantity=1, buy_price=50) for order in cls.orders
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def post(self, order_ids, status):
+        return self.client.post(reverse('shop:bulk_change_order_status'), {'order_ids': order_ids, 'status': status})
+
+    def test_transition_applied_in_constant_queries(self):
+        ids = [order.id for order in self.orders] + [10 ** 9]
+        # сессия, пользователь, UPDATE ... RETURNING, журнал переходов, статусы
+        # пропущенных заказов + SAVEPOINT/RELEASE от transaction.atomic
+        with self.assertNumQueries(7):
+            results = self.post(ids, 'shipped').json()['results']
+        self.assertEqual(results[str(self.orders[0].id)], {'result': 'updated', 'status': 'shipped', 'status_display': 'Shipped'})
+        self.assertEqual(results[str(self.orders[2].id)]['result'], 'skipped')
+        self.assertEqual(results[str(10 ** 9)]['result'], 'not_found')
+        self.assertEqual(Order.objects.filter(status='shipped').count(), 200)
+        self.assertEqual(Order.objects.filter(status='delivered').count(), 100)
+
+    def test_delivery_opens_reviews(self):
+        order = Order.objects.create(user=self.customer, status='shipped', total_price=50)
+        other = Product.objects.create(name='Casein', description='Протеин', price=40, category=self.product.category)
+        OrderItem.objects.create(order=order, product=other, quantity=1, buy_price=40)
+        self.assertFalse(can_review(self.customer, other.pk))
+        self.post(str(order.id), 'delivered')
+        self.assertTrue(can_review(self.customer, other.pk))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post(str(self.orders[0].id), 'pending').status_code, 400)
+        self.assertEqual(self.post('', 'shipped').status_code, 400)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.post(str(self.orders[0].id), 'shipped').status_code, 403)
+
+
+class OrderStatusEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='manager', password='secret', is_staff=True)
+        cls.customer = User.objects.create_user(username='customer', password='secret')
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.product = Product.objects.create(name='Whey', description='Протеин', price=50, category=category, stock=10)
+
+    def test_checkout_and_status_changes_are_logged(self):
+        CartItem.objects.create(user=self.customer, product=self.product)
+        self.client.force_login(self.customer)
+        self.client.post(reverse('shop:create_order'), {'selected_items': CartItem.objects.values_list('id', flat=True)})
+        order = Order.objects.get()
+
+        self.client.force_login(self.staff)
+        self.client.post(reverse('shop:change_order_status', args=[order.pk]), {'status': 'shipped'})
+        self.client.post(reverse('shop:change_order_status', args=[order.pk]), {'status': 'shipped'})
+        self.client.post(reverse('shop:bulk_change_order_status'), {'order_ids': order.pk, 'status': 'delivered'})
+        self.assertEqual(
+            list(order.status_events.order_by('created_at', 'id').values_list('status', flat=True)),
+            ['pending', 'shipped', 'delivered'],
+        )
+
+    def test_admin_form_logs_new_orders_and_keeps_status(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret'))
+        data = {'user': self.customer.pk, 'status': 'pending', 'total_price': 50}
+        self.client.post(reverse('admin:shop_order_add'), data)
+        order = Order.objects.get()
+        # Статус существующего заказа в форме только для чтения
+        self.client.post(reverse('admin:shop_order_change', args=[order.pk]), {**data, 'status': 'canceled'})
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+        self.assertEqual(list(order.status_events.values_list('status', flat=True)), ['pending'])
+
+    def test_latency_percentiles(self):
+        start = timezone.now() - timedelta(days=1)
+        orders = Order.objects.bulk_create([
+            Order(user=self.customer, status='delivered', total_price=50) for _ in range(5)
+        ])
+        events = []
+        for hours, order in zip([1, 2, 3, 4, 10], orders):
+            events += [
+                OrderStatusEvent(order=order, status='pending', created_at=start),
+                OrderStatusEvent(order=order, status='shipped', created_at=start + timedelta(hours=hours)),
+                OrderStatusEvent(order=order, status='delivered', created_at=start + timedelta(hours=hours + 24)),
+            ]
+        OrderStatusEvent.objects.bulk_create(events)
+
+        latency = status_latency(start)
+        self.assertEqual(set(latency), {'pending', 'shipped'})
+        self.assertEqual(latency['pending']['count'], 5)
+        self.assertEqual(latency['pending']['p50'], timedelta(hours=3))
+        self.assertEqual(latency['pending']['p95'], timedelta(hours=8, minutes=48))
+        self.assertEqual(latency['shipped']['p95'], timedelta(hours=24))
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='manager', password='secret', is_staff=True)
+        cls.customer = User.objects.create_user(username='customer', password='secret')
+        cls.category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.whey = Product.objects.create(name='Whey', description='Протеин', price=50, category=cls.category, stock=10)
+        cls.casein = Product.objects.create(name='Casein', description='Протеин', price=30, category=cls.category, stock=10)
+
+    def checkout(self, *lines):
+        for product, quantity in lines:
+            CartItem.objects.create(user=self.customer, product=product, quantity=quantity)
+        order = place_order(self.customer, CartItem.objects.values_list('id', flat=True))
+        self.age_events()
+        return order
+
+    def age_events(self):
+        # Свежие события пропускаются до истечения SAFETY_LAG
+        OrderStatusEvent.objects.update(created_at=F('created_at') - timedelta(hours=1))
+
+    def test_full_then_incremental(self):
+        self.checkout((self.whey, 2), (self.casein, 1))
+        canceled = self.checkout((self.whey, 1))
+        bulk_change_status([canceled.pk], 'canceled')
+        self.age_events()
+        self.assertEqual(update_sales_rollups(), 1)
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.orders_count, day.quantity, day.revenue), (1, 3, 130))
+        self.assertEqual(DailyCategorySales.objects.get().revenue, 130)
+        self.assertEqual(DailyProductSales.objects.get(product=self.whey).quantity, 2)
+
+        self.assertEqual(update_sales_rollups(), 0)
+        order = self.checkout((self.casein, 2))
+        self.assertEqual(update_sales_rollups(), 1)
+        self.assertEqual(DailySales.objects.get().revenue, 190)
+
+        bulk_change_status([order.pk], 'canceled')
+        self.age_events()
+        update_sales_rollups()
+        self.assertEqual(DailySales.objects.get().revenue, 130)
+
+    def test_full_rebuild_leaves_fresh_events_for_next_run(self):
+        self.checkout((self.whey, 1))
+        fresh = place_order(self.customer, [CartItem.objects.create(user=self.customer, product=self.casein).pk])
+        update_sales_rollups(full=True)
+        watermark = RollupWatermark.objects.get(name=SALES_WATERMARK)
+        self.assertLess(watermark.last_event_id, fresh.status_events.get().id)
+
+        # Событие из окна SAFETY_LAG подхватывается, когда окно проходит
+        bulk_change_status([fresh.pk], 'canceled')
+        self.age_events()
+        self.assertEqual(update_sales_rollups(), 1)
+        self.assertEqual(DailySales.objects.get().revenue, 50)
+
+    def test_dashboard_reads_only_rollups(self):
+        self.checkout((self.whey, 2))
+        update_sales_rollups()
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shop:sales_dashboard'), {'days': 7})
+        self.assertEqual(response.context['totals']['revenue'], 100)
+        self.assertEqual(response.context['products'][0]['product__name'], 'Whey')
+        for query in queries:
+            self.assertNotIn('"shop_order"', query['sql'])
+            self.assertNotIn('"shop_orderitem"', query['sql'])
+
+    def test_dashboard_is_staff_only(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse('shop:sales_dashboard')).status_code, 302)
+
+
+class StockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='manager', password='secret', is_staff=True)
+        cls.customer = User.objects.create_user(username='customer', password='secret')
+        category = Category.objects.create(name='Протеины', slug='proteins')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Protein {i}', description='Протеин', price=10, category=category, stock=5)
+            for i in range(6)
+        ])
+
+    def stock(self):
+        return list(Product.objects.order_by('id').values_list('stock', flat=True))
+
+    def fill_cart(self, lines):
+        CartItem.objects.bulk_create([
+            CartItem(user=self.customer, product=product, quantity=quantity) for product, quantity in lines
+        ])
+        return list(CartItem.objects.values_list('id', flat=True))
+
+    def test_checkout_reserves_with_constant_queries(self):
+        for count in (1, 3):
+            CartItem.objects.all().delete()
+            ids = self.fill_cart([(product, 2) for product in self.products[:count]])
+            # чтение корзины, списание остатков, заказ, журнал, позиции, сумма, очистка корзины
+            # + SAVEPOINT/RELEASE вокруг place_order и списания
+            with self.assertNumQueries(11):
+                place_order(self.customer, ids)
+        self.assertEqual(self.stock(), [1, 3, 3, 5, 5, 5])
+
+    def test_shortage_changes_nothing(self):
+        ids = self.fill_cart([(self.products[0], 2), (self.products[1], 6)])
+        self.client.force_login(self.customer)
+        response = self.client.post(reverse('shop:create_order'), {'selected_items': ids})
+        self.assertRedirects(response, reverse('shop:cart'), fetch_redirect_response=False)
+        self.assertEqual(self.stock(), [5] * 6)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertContains(self.client.get(reverse('shop:cart')), 'Недостаточно на складе: Protein 1')
+
+    def test_deleted_product_is_named(self):
+        with self.assertRaisesMessage(OutOfStock, f'товар #{self.products[5].pk + 100} (снят с продажи)'):
+            reserve_stock({self.products[0].pk: 1, self.products[5].pk + 100: 1})
+        self.assertEqual(self.stock()[0], 5)
+
+    def test_cancel_releases_and_uncancel_reserves(self):
+        first = place_order(self.customer, self.fill_cart([(self.products[0], 3), (self.products[1], 1)]))
+        second = place_order(self.customer, self.fill_cart([(self.products[0], 2)]))
+        self.assertEqual(self.stock()[:2], [0, 4])
+
+        self.client.force_login(self.staff)
+        url = reverse('shop:change_order_status', args=[first.pk])
+        self.client.post(url, {'status': 'canceled'})
+        self.assertEqual(self.stock()[:2], [3, 5])
+        bulk_change_status([first.pk, second.pk], 'canceled')
+        self.assertEqual(self.stock()[:2], [5, 5])
+
+        Product.objects.filter(pk=self.products[0].pk).update(stock=1)
+        self.assertEqual(self.client.post(url, {'status': 'pending'}).status_code, 409)
+        self.assertEqual(Order.objects.get(pk=first.pk).status, 'canceled')
+        self.assertEqual(self.stock()[:2], [1, 5])
+
+    def test_untracked_stock_is_not_limited(self):
+        Product.objects.filter(pk=self.products[0].pk).update(stock=None)
+        order = place_order(self.customer, self.fill_cart([(self.products[0], 100), (self.products[1], 1)]))
+        self.assertEqual(self.stock()[:2], [None, 4])
+        bulk_change_status([order.pk], 'canceled')
+        self.assertEqual(self.stock()[:2], [None, 5])
+        self.assertEqual(
+            self.client.get(reverse('shop:product_stock', args=[self.products[0].pk])).json(), {'stock': None},
+        )
+
+    def test_checkout_keeps_product_page_cache(self):
+        product = self.products[0]
+        url = reverse('shop:product', args=[product.pk])
+        self.client.get(url)
+        place_order(self.customer, self.fill_cart([(product, 2)]))
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.assertEqual(self.client.get(reverse('shop:product_stock', args=[product.pk])).json(), {'stock': 3})
+
+    def test_save_does_not_overwrite_counters(self):
+        product = Product.objects.defer('description').get(pk=self.products[0].pk)
+        place_order(self.customer, self.fill_cart([(product, 2)]))
+        Product.objects.filter(pk=product.pk).apply_review(5, 1)
+        product.name = 'Renamed'
+        # UPDATE загруженных полей без дочитывания отложенных + корзины с товаром из сигнала
+        with self.assertNumQueries(2):
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.description, product.stock), ('Renamed', 'Протеин', 3))
+        self.assertEqual((product.rating_count, product.stars_5, product.rating_avg), (1, 1, 5))
+
+    def test_product_form_adds_restock(self):
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(stock=2)
+        self.client.force_login(self.staff)
+        self.client.post(reverse('shop:product_edit', args=[product.pk]), {
+            'name': product.name, 'description': 'Новое', 'price': 12,
+            'category': product.category_id, 'restock': 10,
+        })
+        product.refresh_from_db()
+        self.assertEqual((product.description, product.stock), ('Новое', 12))
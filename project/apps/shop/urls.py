@@ -5,7 +5,10 @@ app_name = 'shop'
 
 urlpatterns = [
     path('', views.products, name='products'),
+    path('products/feed/', views.products_feed, name='products_feed'),
+    path('products/ratings/', views.product_ratings, name='product_ratings'),
     path('product/<int:pk>/', views.product, name='product'),
+    path('product/<int:pk>/stock/', views.product_stock, name='product_stock'),
     path('products/add/', views.ProductCreateView.as_view(), name='product_add'),
     path('products/<int:pk>/edit/', views.ProductUpdateView.as_view(), name='product_edit'),
     path('products/<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
@@ -21,7 +24,12 @@ urlpatterns = [
 
     path('orders/', views.order_list, name='order_list'),
     path('orders/<int:order_id>/status/', views.change_order_status, name='change_order_status'),
+    path('analytics/', views.sales_dashboard, name='sales_dashboard'),
+    path('orders/status/bulk/', views.bulk_change_order_status, name='bulk_change_order_status'),
 
+    path('product/<int:pk>/reviews/', views.product_reviews, name='product_reviews'),
     path('reviews/add/<int:pk>/', views.add_review_ajax, name='add_review_ajax'),
     path('reviews/delete/<int:review_id>/', views.delete_review, name='delete_review'),
+
+    path('likes/<str:kind>/<int:object_id>/toggle/', views.toggle_like, name='toggle_like'),
 ]
@@ -1,189 +1,329 @@
 import json
+from urllib.parse import urlencode
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Product, CartItem, Category, Order, OrderItem, Review
-from django.http import JsonResponse
+from .models import (
+    RATING_STARS, Product, CartItem, Category, Order, Review,
+    DailySales, DailyCategorySales, DailyProductSales, RollupWatermark,
+)
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
-from django.db.models import F, Avg
-from decimal import Decimal
 from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Sum
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import CreateView, UpdateView, DeleteView, ListView, DetailView
 from .forms import ProductForm, ReviewForm
+from .pagination import keyset_paginate
+from .search import search_products
+from .facets import PRICE_STEP, product_facets
+from .cart import (
+    add_to_cart, cart_summary, invalidate_cart_summaries, line_total, refresh_cart_summary, toggle_cart_item,
+)
+from .rollups import SALES_WATERMARK
+from .orders import ORDER_TRANSITIONS, bulk_change_status, log_status, order_items_count_subquery, place_order
+from .stock import OutOfStock, release_stock, reserve_stock, restock
+from .reviews import can_review, review_page, serialize_review
+from .caching import CATALOG, CATEGORIES, bump_version, cache_anonymous_page, product_namespace
+from .likes import attach_likes, likeable_model, toggle_vote
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
 from django.contrib.admin.views.decorators import staff_member_required
 
 
-def products(request):
-    qs = Product.objects.select_related('category').all()
+PRODUCTS_PER_PAGE = 12
+
+SORT_ORDERINGS = {
+    'latest': ('-created_at', '-id'),
+    'best_reviews': ('-rating_avg', '-created_at', '-id'),
+    'price_desc': ('-price', '-id'),
+    'price_asc': ('price', 'id'),
+}
+
+RELEVANCE_ORDERING = ('-rank', '-id')
+
+
+def filter_products(request):
+    """
+    Разбирает GET-параметры каталога. Возвращает (qs, conditions, category, sort):
+    qs — товары с учётом поиска, conditions — ещё не применённые Q-условия
+    по фасетам. При поиске без явной сортировки sort становится 'relevance'.
+    """
+    qs = Product.objects.select_related('category').defer('search_vector')
     category_slug = request.GET.get('category')
     search_query = request.GET.get('q', '').strip()
     price_min = request.GET.get('price_min')
     price_max = request.GET.get('price_max')
+    rating_min = request.GET.get('rating_min')
     sort = request.GET.get('sort', '')
     category = None
+    conditions = {}
     if category_slug:
         category = Category.objects.filter(slug=category_slug).first()
         if category:
-            qs = qs.filter(category=category)
+            conditions['category'] = Q(category=category)
     if search_query:
-        qs = qs.filter(name__icontains=search_query)
+        qs = search_products(qs, search_query)
+        if not sort:
+            sort = 'relevance'
+    price = Q()
     if price_min:
         try:
-            qs = qs.filter(price__gte=float(price_min))
+            price &= Q(price__gte=float(price_min))
         except ValueError:
             pass
     if price_max:
         try:
-            qs = qs.filter(price__lte=float(price_max))
+            price &= Q(price__lte=float(price_max))
         except ValueError:
             pass
-    if sort == 'latest':
-        qs = qs.order_by('-created_at')
-    elif sort == 'best_reviews':
-        qs = qs.annotate(avg_rating=Avg('reviews__rating')).order_by('-avg_rating', '-created_at')
-    elif sort == 'price_desc':
-        qs = qs.order_by('-price')
-    elif sort == 'price_asc':
-        qs = qs.order_by('price')
-    else:
-        qs = qs.order_by('-created_at')
-    paginator = Paginator(qs, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if price:
+        conditions['price'] = price
+    if rating_min:
+        try:
+            conditions['rating'] = Q(rating_avg__gte=int(rating_min))
+        except ValueError:
+            pass
+    return qs, conditions, category, sort
+
 
+@cache_anonymous_page(lambda request: [CATALOG])
+def products(request):
+    base_qs, conditions, category, sort = filter_products(request)
+    qs = base_qs.filter(*conditions.values())
+    ordering = SORT_ORDERINGS.get(sort, SORT_ORDERINGS['latest'])
+    categories = list(Category.objects.all())
+    facets = product_facets(base_qs, conditions, categories)
+    for cat in categories:
+        cat.facet_count = facets['categories'][cat.pk]
+    for bucket in facets['price']:
+        params = request.GET.copy()
+        for key in ('price_min', 'price_max', 'page', 'cursor'):
+            params.pop(key, None)
+        if bucket['min'] is not None:
+            params['price_min'] = bucket['min']
+        if bucket['max'] is not None:
+            params['price_max'] = bucket['max'] - PRICE_STEP
+        bucket['query'] = params.urlencode()
     context = {
-        'products': page_obj,
         'category': category,
-        'categories': Category.objects.all(),
-        'paginator': paginator,
-        'page_obj': page_obj,
+        'categories': categories,
+        'facets': facets,
         'sort': sort,
     }
+    if 'cursor' in request.GET:
+        page = keyset_paginate(qs, ordering, request.GET.get('cursor'), PRODUCTS_PER_PAGE)
+        context.update({
+            'products': page,
+            'cursor_page': page,
+        })
+    else:
+        if sort == 'relevance':
+            ordering = RELEVANCE_ORDERING
+        paginator = Paginator(qs.order_by(*ordering), PRODUCTS_PER_PAGE)
+        # COUNT(*) по тому же набору фильтров уже посчитан в фасетах
+        paginator.count = facets['total']
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+        context.update({
+            'products': page_obj,
+            'paginator': paginator,
+            'page_obj': page_obj,
+        })
     return render(request, 'shop/products.html', context)
 
 
+def products_feed(request):
+    """JSON-лента каталога для бесконечной прокрутки (keyset-пагинация)."""
+    base_qs, conditions, category, sort = filter_products(request)
+    qs = base_qs.filter(*conditions.values())
+    ordering = SORT_ORDERINGS.get(sort, SORT_ORDERINGS['latest'])
+    page = keyset_paginate(qs, ordering, request.GET.get('cursor'), PRODUCTS_PER_PAGE)
+    return JsonResponse({
+        'products': [
+            {
+                'id': p.id,
+                'name': p.name,
+                'price': float(p.price),
+                'category': p.category.name,
+                'image': p.image,
+                'rating_avg': float(p.rating_avg),
+                'url': reverse('shop:product', args=[p.pk]),
+            }
+            for p in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required
 def add_review_ajax(request, pk):
     if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
         product = get_object_or_404(Product, pk=pk)
-        has_ordered = OrderItem.objects.filter(
-            order__user=request.user,
-            product=product,
-            order__status='delivered'
-        ).exists()
-        user_review_exists = Review.objects.filter(user=request.user, product=product).exists()
-        if not has_ordered or user_review_exists:
+        if not can_review(request.user, product.pk):
             return JsonResponse({'success': False})
         data = json.loads(request.body)
         text = data.get('text', '').strip()
         rating = int(data.get('rating', 0))
         if text and 1 <= rating <= 5:
-            review = Review.objects.create(
-                user=request.user,
-                product=product,
-                text=text,
-                rating=rating,
-                created_at=timezone.now()
-            )
-            return JsonResponse({
-                'success': True,
-                'username': review.user.username,
-                'text': review.text,
-                'rating': review.rating,
-                'created_at': review.created_at.strftime('%d.%m.%Y %H:%M')
-            })
+            with transaction.atomic():
+                review = Review.objects.create(
+                    user=request.user,
+                    product=product,
+                    text=text,
+                    rating=rating,
+                    created_at=timezone.now()
+                )
+                product.apply_review(review.rating, 1)
+            return JsonResponse({'success': True, **serialize_review(review)})
 
     return JsonResponse({'success': False})
 
 
+@cache_anonymous_page(lambda request, pk: [product_namespace(pk), CATEGORIES])
 def product(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    reviews = product.reviews.select_related('user').all()
-    in_cart = False
-    can_review = False
-    user_review_exists = False
+    qs = Product.objects.select_related('category').defer('search_vector')
+    if request.user.is_authenticated:
+        qs = qs.annotate(
+            in_cart=Exists(CartItem.objects.filter(user=request.user, product=OuterRef('pk'))),
+        )
+    product = get_object_or_404(qs, pk=pk)
+    in_cart = getattr(product, 'in_cart', False)
+    review_allowed = False
 
     if request.user.is_authenticated:
-        in_cart = CartItem.objects.filter(user=request.user, product=product).exists()
-        has_ordered = OrderItem.objects.filter(
-            order__user=request.user,
-            product=product,
-            order__status='delivered'
-        ).exists()
-        user_review_exists = Review.objects.filter(user=request.user, product=product).exists()
-        can_review = has_ordered and not user_review_exists
+        review_allowed = can_review(request.user, product.pk)
 
         if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            if can_review:
+            if review_allowed:
                 import json
                 data = json.loads(request.body)
                 text = data.get('text', '').strip()
                 rating = int(data.get('rating', 0))
                 if text and 1 <= rating <= 5:
-                    review = Review.objects.create(
-                        user=request.user,
-                        product=product,
-                        text=text,
-                        rating=rating,
-                        created_at=timezone.now()
-                    )
-                    return JsonResponse({
-                        'success': True,
-                        'username': review.user.username,
-                        'text': review.text,
-                        'rating': review.rating,
-                        'created_at': review.created_at.strftime('%d.%m.%Y %H:%M')
-                    })
+                    with transaction.atomic():
+                        review = Review.objects.create(
+                            user=request.user,
+                            product=product,
+                            text=text,
+                            rating=rating,
+                            created_at=timezone.now()
+                        )
+                        product.apply_review(review.rating, 1)
+                    return JsonResponse({'success': True, **serialize_review(review)})
             return JsonResponse({'success': False})
-    else:
-        can_review = False
 
-    form = ReviewForm() if can_review else None
-    avg_rating = reviews.aggregate(avg=Avg('rating'))['avg']
-    avg_rating = round(avg_rating or 0, 1)
+    form = ReviewForm() if review_allowed else None
+    avg_rating = round(product.rating_avg, 1)
+    reviews = attach_likes(review_page(product), request.user)
     context = {
         'product': product,
         'reviews': reviews,
         'in_cart': in_cart,
-        'can_review': can_review,
+        'can_review': review_allowed,
         'form': form,
         'avg_rating': avg_rating,
     }
     return render(request, 'shop/product.html', context)
 
 
+def product_stock(request, pk):
+    """
+    Остаток товара (null — не учитывается). Запрашивается страницей отдельно,
+    чтобы заказы не сбрасывали закэшированную страницу товара.
+    """
+    product = get_object_or_404(Product.objects.only('id', 'stock'), pk=pk)
+    return JsonResponse({'stock': product.stock})
+
+
+RATINGS_BATCH_LIMIT = 100
+
+
+def product_ratings(request):
+    """Сводка оценок для нескольких товаров сразу: ?ids=1,2,3 (не больше RATINGS_BATCH_LIMIT)."""
+    ids = []
+    for value in request.GET.get('ids', '').split(','):
+        try:
+            ids.append(int(value))
+        except ValueError:
+            pass
+    rows = Product.objects.filter(id__in=ids[:RATINGS_BATCH_LIMIT]).values(
+        'id', 'rating_avg', 'rating_count', *(f'stars_{stars}' for stars in RATING_STARS),
+    )
+    return JsonResponse({
+        'ratings': {
+            row['id']: {
+                'avg': float(row['rating_avg']),
+                'count': row['rating_count'],
+                'histogram': {stars: row[f'stars_{stars}'] for stars in RATING_STARS},
+            }
+            for row in rows
+        },
+    })
+
+
+def product_reviews(request, pk):
+    """JSON-лента отзывов товара: sort=newest|highest|lowest, cursor — следующая страница."""
+    product = get_object_or_404(Product.objects.only('id'), pk=pk)
+    page = review_page(product, request.GET.get('sort', 'newest'), request.GET.get('cursor'))
+    attach_likes(page, request.user)
+    return JsonResponse({
+        'reviews': [serialize_review(review) for review in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@login_required
+@require_POST
+def toggle_like(request, kind, object_id):
+    """Лайк (is_like=1) или дизлайк (is_like=0) статьи, комментария или отзыва."""
+    model = likeable_model(kind)
+    if model is None:
+        raise Http404
+    obj = get_object_or_404(model, pk=object_id)
+    result = toggle_vote(request.user, obj, request.POST.get('is_like', '1') != '0')
+    if isinstance(obj, Review):
+        # счётчики отзывов входят в закэшированную страницу товара
+        bump_version(product_namespace(obj.product_id))
+    return JsonResponse(result)
+
+
 @staff_member_required
 def delete_review(request, review_id):
     if request.method == 'POST':
-        review = Review.objects.filter(id=review_id).first()
+        review = Review.objects.filter(id=review_id).only('id', 'user_id', 'product_id', 'rating').first()
         if review:
-            review.delete()
+            # Параллельное удаление того же отзыва не должно уменьшить счётчики дважды
+            with transaction.atomic():
+                deleted, _ = Review.objects.filter(pk=review.pk).delete()
+                if deleted:
+                    Product.objects.filter(pk=review.product_id).apply_review(review.rating, -1)
             return JsonResponse({'success': True})
     return JsonResponse({'success': False})
 
 
 @login_required
 def cart(request):
-    cart_items = CartItem.objects.filter(user=request.user).select_related('product')
-    cart_total = sum(item.get_total_price() for item in cart_items)
+    cart_items = (
+        CartItem.objects.filter(user=request.user)
+        .select_related('product')
+        .annotate(line_total=line_total())
+    )
     return render(request, "shop/cart.html", {
         "cart_items": cart_items,
-        "cart_total": cart_total,
+        "cart_total": cart_summary(request.user)['total'],
     })
 
 
 @login_required
 def to_cart(request, product_id):
     if request.method == "POST":
-        product = Product.objects.get(pk=product_id)
-        cart_item, created = CartItem.objects.get_or_create(user=request.user, product=product)
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
-        cart_item_count = CartItem.objects.filter(user=request.user).count()
+        if not add_to_cart(request.user, product_id):
+            raise Http404
+        cart_item_count = refresh_cart_summary(request.user)['count']
         return JsonResponse({'cart_item_count': cart_item_count})
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
@@ -191,15 +331,13 @@ def to_cart(request, product_id):
 @login_required
 def from_cart(request, item_id):
     if request.method == "POST":
-        item = get_object_or_404(CartItem, id=item_id, user=request.user)
-        item.delete()
-        cart_items = CartItem.objects.filter(user=request.user).select_related('product')
-        total = sum((ci.get_total_price() for ci in cart_items), Decimal(0))
-        cart_count = cart_items.count()
-        cart_total_value = float(total)
+        deleted, _ = CartItem.objects.filter(id=item_id, user=request.user).delete()
+        if not deleted:
+            raise Http404
+        summary = refresh_cart_summary(request.user)
         return JsonResponse({
-            "cart_item_count": cart_count,
-            "cart_total": cart_total_value,
+            "cart_item_count": summary['count'],
+            "cart_total": float(summary['total']),
             "item_id": item_id,
         })
     return JsonResponse({"error": "Invalid request"}, status=400)
@@ -208,15 +346,10 @@ def from_cart(request, item_id):
 @login_required
 def toggle_cart(request, product_id):
     if request.method == "POST":
-        product = get_object_or_404(Product, pk=product_id)
-        cart_item = CartItem.objects.filter(user=request.user, product=product).first()
-        if cart_item:
-            cart_item.delete()
-            action = "removed"
-        else:
-            CartItem.objects.create(user=request.user, product=product, quantity=1)
-            action = "added"
-        cart_item_count = CartItem.objects.filter(user=request.user).count()
+        action = toggle_cart_item(request.user, product_id)
+        if action is None:
+            raise Http404
+        cart_item_count = refresh_cart_summary(request.user)['count']
         return JsonResponse({'cart_item_count': cart_item_count, 'action': action})
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
@@ -225,59 +358,49 @@ def toggle_cart(request, product_id):
 @require_POST
 def update_cart_quantity(request, item_id):
     action = request.POST.get('action')
-    item = get_object_or_404(CartItem, id=item_id, user=request.user)
+    items = CartItem.objects.filter(id=item_id, user=request.user)
     if action == "plus":
-        item.quantity = F('quantity') + 1
-        item.save(update_fields=['quantity'])
+        changed = items.update(quantity=F('quantity') + 1)
     elif action == "minus":
-        if item.quantity > 1:
-            item.quantity = F('quantity') - 1
-            item.save(update_fields=['quantity'])
-        else:
-            item.delete()
-            cart_items = CartItem.objects.filter(user=request.user).select_related('product')
-            total = sum((ci.get_total_price() for ci in cart_items), Decimal(0))
-            cart_count = cart_items.count()
-            return JsonResponse({
-                "deleted": True,
-                "cart_item_count": cart_count,
-                "cart_total": float(total),
-                "item_id": item_id,
-            })
-    item.refresh_from_db()
-    cart_items = CartItem.objects.filter(user=request.user).select_related('product')
-    total = sum((ci.get_total_price() for ci in cart_items), Decimal(0))
+        changed = items.filter(quantity__gt=1).update(quantity=F('quantity') - 1)
+        if not changed:
+            changed, _ = items.delete()
+    else:
+        changed = items.exists()
+    if not changed:
+        raise Http404
+    summary = refresh_cart_summary(request.user, item_id)
+    if summary['item_quantity'] is None:
+        return JsonResponse({
+            "deleted": True,
+            "cart_item_count": summary['count'],
+            "cart_total": float(summary['total']),
+            "item_id": item_id,
+        })
     return JsonResponse({
         "deleted": False,
-        "item_id": item.id,
-        "quantity": item.quantity,
-        "item_total": float(item.get_total_price()),
-        "cart_total": float(total),
-        "cart_item_count": cart_items.count(),
+        "item_id": item_id,
+        "quantity": summary['item_quantity'],
+        "item_total": float(summary['item_total']),
+        "cart_total": float(summary['total']),
+        "cart_item_count": summary['count'],
     })
 
 
 @login_required
-@transaction.atomic
 def create_order(request):
     if request.method == "POST":
         selected_ids = request.POST.getlist("selected_items")
         if not selected_ids:
             return redirect("shop:cart")
-        selected_items = CartItem.objects.filter(id__in=selected_ids, user=request.user).select_related('product')
-        total_price = sum(item.get_total_price() for item in selected_items)
-        order = Order.objects.create(
-            user=request.user,
-            total_price=total_price
-        )
-        for item in selected_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                buy_price=item.product.price
-            )
-        selected_items.delete()
+        try:
+            order = place_order(request.user, selected_ids)
+        except OutOfStock as exc:
+            messages.error(request, 'Недостаточно на складе: ' + ', '.join(exc.products))
+            return redirect("shop:cart")
+        invalidate_cart_summaries([request.user.pk])
+        if order is None:
+            return redirect("shop:cart")
         return redirect("shop:order_detail", order_id=order.id)
     return redirect("shop:cart")
 
@@ -315,6 +438,10 @@ class ProductCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     template_name = 'shop/product_form.html'
     success_url = reverse_lazy('shop:products')
 
+    def form_valid(self, form):
+        form.instance.stock = form.cleaned_data.get('restock')
+        return super().form_valid(form)
+
 
 class ProductUpdateView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
     model = Product
@@ -322,6 +449,12 @@ class ProductUpdateView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
     template_name = 'shop/product_form.html'
     success_url = reverse_lazy('shop:products')
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if form.cleaned_data.get('restock'):
+            restock(self.object.pk, form.cleaned_data['restock'])
+        return response
+
 
 class ProductDeleteView(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
     model = Product
@@ -329,13 +462,68 @@ class ProductDeleteView(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
     success_url = reverse_lazy('shop:products')
 
 
-@login_required
-def order_list(request):
+ORDERS_PER_PAGE = 20
+
+ORDER_ORDERING = ('-created_at', '-id')
+
+
+def _day_start(value):
+    """Начало дня YYYY-MM-DD в текущей таймзоне или None."""
+    try:
+        day = parse_date(value or '')
+    except ValueError:
+        return None
+    return timezone.make_aware(datetime.combine(day, time.min)) if day else None
+
+
+def filter_orders(request):
+    """
+    Заказы с учётом GET-фильтров status, date_from, date_to и (только для
+    персонала) user — имя пользователя. Даты превращаются в диапазон по
+    created_at, чтобы работали индексы. Возвращает (qs, filters).
+    """
     if request.user.is_staff:
-        orders = Order.objects.select_related('user').all().order_by('-created_at')
+        qs = Order.objects.select_related('user')
     else:
-        orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'shop/orders.html', {'orders': orders})
+        qs = Order.objects.filter(user=request.user)
+    filters = {}
+    status = request.GET.get('status')
+    if status in dict(Order.STATUS_CHOICES):
+        qs = qs.filter(status=status)
+        filters['status'] = status
+    date_from = _day_start(request.GET.get('date_from'))
+    if date_from:
+        qs = qs.filter(created_at__gte=date_from)
+        filters['date_from'] = request.GET['date_from']
+    date_to = _day_start(request.GET.get('date_to'))
+    if date_to:
+        qs = qs.filter(created_at__lt=date_to + timedelta(days=1))
+        filters['date_to'] = request.GET['date_to']
+    username = request.GET.get('user', '').strip()
+    if username and request.user.is_staff:
+        qs = qs.filter(user__username=username)
+        filters['user'] = username
+    return qs, filters
+
+
+@login_required
+def order_list(request):
+    qs, filters = filter_orders(request)
+    qs = qs.annotate(items_count=order_items_count_subquery())
+    page = keyset_paginate(qs, ORDER_ORDERING, request.GET.get('cursor'), ORDERS_PER_PAGE)
+    next_query = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
+    return render(request, 'shop/orders.html', {
+        'orders': page,
+        'filters': filters,
+        'statuses': Order.STATUS_CHOICES,
+        'next_query': next_query,
+        'first_page_query': urlencode(filters),
+        'is_first_page': not request.GET.get('cursor'),
+    })
 
 
 @login_required
@@ -343,10 +531,109 @@ def order_list(request):
 def change_order_status(request, order_id):
     if not request.user.is_staff:
         return JsonResponse({'error': 'Forbidden'}, status=403)
-    order = get_object_or_404(Order, id=order_id)
     status = request.POST.get('status')
     if status not in dict(Order.STATUS_CHOICES):
         return JsonResponse({'error': 'Invalid status'}, status=400)
-    order.status = status
-    order.save()
-    return JsonResponse({'success': True, 'status': order.get_status_display()})
\ No newline at end of file
+    with transaction.atomic():
+        order = get_object_or_404(Order.objects.select_for_update().only('id', 'user_id', 'status'), id=order_id)
+        if order.status != status:
+            # Отменённый заказ не держит товар: при отмене остаток возвращается,
+            # при возврате из отмены списывается заново
+            if status == 'canceled':
+                release_stock([order.pk])
+            elif order.status == 'canceled':
+                quantities = dict(order.items.values_list('product_id', 'quantity'))
+                try:
+                    reserve_stock(quantities)
+                except OutOfStock as exc:
+                    return JsonResponse({'error': 'Недостаточно на складе: ' + ', '.join(exc.products)}, status=409)
+            order.status = status
+            order.save(update_fields=['status'])
+            log_status([order.pk], status)
+    return JsonResponse({'success': True, 'status': order.get_status_display()})
+
+
+BULK_STATUS_LIMIT = 1000
+
+
+@login_required
+@require_POST
+def bulk_change_order_status(request):
+    """
+    Массовая смена статуса: order_ids (несколько значений или через запятую)
+    и status. Отвечает исходом по каждому заказу, см. bulk_change_status.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    status = request.POST.get('status')
+    if status not in ORDER_TRANSITIONS:
+        return JsonResponse({'error': 'Invalid status'}, status=400)
+    order_ids = []
+    for value in request.POST.getlist('order_ids'):
+        for part in value.split(','):
+            try:
+                order_ids.append(int(part))
+            except ValueError:
+                pass
+    if not order_ids or len(order_ids) > BULK_STATUS_LIMIT:
+        return JsonResponse({'error': f'Нужно от 1 до {BULK_STATUS_LIMIT} заказов'}, status=400)
+    outcomes = bulk_change_status(order_ids, status)
+    labels = dict(Order.STATUS_CHOICES)
+    return JsonResponse({
+        'success': True,
+        'results': {
+            order_id: {**outcome, 'status_display': labels.get(outcome['status'])}
+            for order_id, outcome in outcomes.items()
+        },
+    })
+
+
+DASHBOARD_PERIODS = (7, 30, 90)
+
+DASHBOARD_TOP_PRODUCTS = 10
+
+
+@staff_member_required
+def sales_dashboard(request):
+    """
+    Аналитика продаж за период по дневным сводкам (см. rollups.py).
+    Заказы и их позиции не читаются; к сводкам присоединяются только
+    справочники категорий и товаров ради названий, чтобы после
+    переименования показывались актуальные.
+    """
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    if days not in DASHBOARD_PERIODS:
+        days = 30
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals_fields = {'revenue': Sum('revenue'), 'quantity': Sum('quantity')}
+
+    daily = list(DailySales.objects.filter(day__gte=since).order_by('day'))
+    totals = DailySales.objects.filter(day__gte=since).aggregate(orders=Sum('orders_count'), **totals_fields)
+    categories = list(
+        DailyCategorySales.objects.filter(day__gte=since)
+        .values('category__name')
+        .annotate(**totals_fields)
+        .order_by('-revenue')
+    )
+    products = list(
+        DailyProductSales.objects.filter(day__gte=since)
+        .values('product_id', 'product__name')
+        .annotate(**totals_fields)
+        .order_by('-revenue')[:DASHBOARD_TOP_PRODUCTS]
+    )
+    max_revenue = max((row.revenue for row in daily), default=0)
+    for row in daily:
+        row.percent = round(row.revenue * 100 / max_revenue) if max_revenue else 0
+
+    return render(request, 'shop/analytics.html', {
+        'days': days,
+        'periods': DASHBOARD_PERIODS,
+        'daily': daily,
+        'totals': totals,
+        'categories': categories,
+        'products': products,
+        'watermark': RollupWatermark.objects.filter(name=SALES_WATERMARK).first(),
+    })
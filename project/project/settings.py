@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'phonenumber_field',
     'apps.articles',
     'apps.users',
@@ -90,6 +92,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# По умолчанию кэш в памяти процесса; для нескольких воркеров задайте, например,
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# и DJANGO_CACHE_LOCATION=redis://127.0.0.1:6379/1
+# (или django.core.cache.backends.filebased.FileBasedCache с путём к каталогу).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'sportstore'),
+        'KEY_PREFIX': 'sportstore',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 